@@ -0,0 +1,32 @@
+# Cumulative import time of slimp and of its heavy dependencies, as reported by
+# -X importtime. The sub-modules and the native extensions are only imported on
+# first use.
+
+import re
+import subprocess
+import sys
+
+statements = {
+    "import slimp": "import slimp",
+    "slimp.Model": "import slimp; slimp.Model",
+    "slimp.plots": "import slimp; slimp.KDEPlot"}
+modules = ["slimp", "slimp._slimp", "pandas", "formulaic", "arviz", "seaborn"]
+
+for name, statement in statements.items():
+    durations = []
+    for _ in range(5):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            capture_output=True, text=True, check=True)
+        times = {}
+        for line in process.stderr.splitlines():
+            match = re.match(
+                r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*(.+)", line)
+            if match:
+                times[match.group(2).strip()] = int(match.group(1))
+        durations.append(times)
+    
+    # NOTE: the best run is the least affected by the load of the machine
+    print(f"{name}: " + ", ".join(
+        f"{module} {min(x[module] for x in durations)/1e3:.1f} ms"
+        for module in modules if module in durations[0]))
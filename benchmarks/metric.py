@@ -0,0 +1,40 @@
+# Effective sample size per gradient evaluation of the NUTS metrics, on a
+# multilevel model with correlated intercepts and slopes
+
+import numpy
+import pandas
+import slimp
+
+N = 20_000
+J = 200
+chains = 4
+
+generator = numpy.random.default_rng(42)
+group = generator.integers(0, J, N)
+x = generator.uniform(0, 10, N)
+covariance = [[25, 4], [4, 1]]
+intercepts, slopes = generator.multivariate_normal([0, 0], covariance, J).T
+y = 10 + intercepts[group] + (2+slopes[group])*x + generator.normal(0, 2, N)
+data = pandas.DataFrame({
+    "x": x, "y": y, "group": pandas.Categorical(group)})
+formula = ["y ~ 1 + x", ("group", "1 + x")]
+
+print(f"{N} observations, {J} groups, {chains} chains")
+
+for metric in ["diag_e", "dense_e", "unit_e"]:
+    model = slimp.Model(
+        formula, data, seed=42, num_chains=chains, metric=metric)
+    model.sample()
+    
+    diagnostics = model._samples.diagnostics
+    gradients = diagnostics.sel(parameter="n_leapfrog__").values.sum()
+    max_depth = (
+        diagnostics.sel(parameter="treedepth__").values
+        >= model.sampler_parameters.hmc.max_depth).mean()
+    
+    ess = model.summary()["N_Eff"].drop("lp__")
+    print(
+        f"{metric}: {gradients} gradients, "
+        f"{100*max_depth:.1f}% draws at max depth, "
+        f"min ESS/1000 gradients {1000*ess.min()/gradients:.2f}, "
+        f"median ESS/1000 gradients {1000*ess.median()/gradients:.2f}")
@@ -0,0 +1,39 @@
+# Effective sample size per second of the multilevel samplers: observation
+# loop, group segments, and group segments with non-centered coefficients
+
+import time
+
+import numpy
+import pandas
+import slimp
+
+N = 200_000
+J = 2_000
+chains = 4
+
+generator = numpy.random.default_rng(42)
+group = generator.integers(0, J, N)
+x = generator.uniform(0, 10, N)
+intercepts, slopes = generator.normal([0, 0], [5, 1], (J, 2)).T
+y = 10 + intercepts[group] + (2+slopes[group])*x + generator.normal(0, 2, N)
+data = pandas.DataFrame({
+    "x": x, "y": y, "group": pandas.Categorical(group)})
+formula = ["y ~ 1 + x", ("group", "1 + x")]
+
+print(f"{N} observations, {J} groups, {chains} chains")
+
+variants = {
+    "Loop": {},
+    "Segments": {"sort_groups": True},
+    "Segments, non-centered": {"non_centered": True}}
+for name, options in variants.items():
+    model = slimp.Model(formula, data, seed=42, num_chains=chains, **options)
+    start = time.perf_counter()
+    model.sample()
+    duration = time.perf_counter() - start
+    
+    ess = model.summary()["N_Eff"].drop("lp__")
+    print(
+        f"{name}: {duration:.1f} s, "
+        f"min ESS/s {ess.min()/duration:.1f}, "
+        f"median ESS/s {ess.median()/duration:.1f}")
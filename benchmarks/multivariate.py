@@ -0,0 +1,50 @@
+# Effective sample size per second of the multivariate model with covariance.
+# The reference is the reduce_sum variant run on a single thread, which builds
+# the mean as an array of per-observation vectors without QR decomposition, as
+# the sampler did before vectorization. Run this script on an earlier revision
+# to compare with the original sampler. The two programs have different
+# parameters (QR-space coefficients, constant entries of the Cholesky factor),
+# so the ESS is only compared on the intercepts, coefficients and scales.
+
+import time
+
+import numpy
+import pandas
+import slimp
+
+N = 500_000
+R = 6
+chains = 4
+
+generator = numpy.random.default_rng(42)
+x, z = generator.uniform(0, 10, (2, N))
+correlation = numpy.full((R, R), 0.5) + 0.5*numpy.eye(R)
+noise = generator.multivariate_normal(numpy.zeros(R), 4*correlation, N)
+outcomes = {
+    f"y{r}": 10 + (1+r)*x + 2*z + noise[:, r] for r in range(R)}
+data = pandas.DataFrame({"x": x, "z": z, **outcomes})
+formula = [f"{y} ~ 1 + x + z" for y in outcomes]
+
+print(f"{N} observations, {R} outcomes, {chains} chains")
+
+# Stan names of the parameters shared by both programs
+shared = [
+    f"{name}.{1+i}"
+    for name, size in [("alpha_c", R), ("beta", 2*R), ("sigma", R)]
+    for i in range(size)]
+
+samplers = {
+    "Per-observation mean": slimp._multivariate.multivariate_parallel_sampler,
+    "Vectorized, QR": None}
+for name, sampler in samplers.items():
+    model = slimp.Model(formula, data, seed=42, num_chains=chains)
+    start = time.perf_counter()
+    model.sample(sampler)
+    duration = time.perf_counter() - start
+    
+    ess = model.summary()["N_Eff"].loc[
+        model._model_data.predictor_mapper(shared)]
+    print(
+        f"{name}: {duration:.1f} s, "
+        f"min ESS/s {ess.min()/duration:.1f}, "
+        f"median ESS/s {ess.median()/duration:.1f}")
@@ -0,0 +1,28 @@
+# Compare the Stan and NumPy engines of posterior predictions on a linear model
+
+import timeit
+
+import numpy
+import pandas
+import slimp
+
+N = 100_000
+
+generator = numpy.random.default_rng(42)
+x, y = generator.uniform(0, 10, (2, N))
+z = 10 + x + 2*y + generator.normal(0, 2, N)
+data = pandas.DataFrame({"x": x, "y": y, "z": z})
+
+model = slimp.Model("z ~ 1 + x + y", data, seed=42, num_chains=4)
+model.sample()
+
+engines = {
+    "Stan": lambda: model._generate_quantities("predict_posterior"),
+    "NumPy": lambda: model._predict_posterior()}
+durations = {
+    name: min(timeit.repeat(engine, number=1, repeat=3))
+    for name, engine in engines.items()}
+
+for name, duration in durations.items():
+    print(f"{name}: {duration:.2f} s")
+print(f"Speedup: {durations['Stan']/durations['NumPy']:.1f}×")
@@ -0,0 +1,45 @@
+# Per-call latency of predictions on small batches: predictors built from the
+# fitted model spec or by parsing the formula again, and predictions from the
+# model or from its frozen predictor
+
+import timeit
+
+import formulaic
+import numpy
+import pandas
+import slimp
+
+N = 1000
+
+generator = numpy.random.default_rng(42)
+x, y = generator.uniform(0, 10, (2, N))
+g = generator.choice(["a", "b", "c"], N)
+z = 10 + x + 2*y + (g == "b") + generator.normal(0, 2, N)
+data = pandas.DataFrame({
+    "x": x, "y": y, "g": pandas.Categorical(g), "z": z})
+
+model = slimp.Model("z ~ 1 + x + y + g", data, seed=42, num_chains=4)
+model.sample()
+predictor = model.freeze()
+
+for size in [1, 10, 100]:
+    batch = data.iloc[:size]
+    predictors = {
+        "Parse": lambda: formulaic.model_matrix(
+            model.formula.split("~")[1], batch),
+        "Spec": lambda: model._model_data.new_predictors(batch)}
+    durations = {
+        name: min(timeit.repeat(function, number=100, repeat=5))/100
+        for name, function in predictors.items()}
+    predictions = {
+        "predict": lambda: model.predict(batch),
+        "Predictor": lambda: predictor.predict(batch),
+        "Predictor (predictors)": lambda: predictor.predict(X)}
+    X = predictor.predictors(batch)
+    durations |= {
+        name: min(timeit.repeat(function, number=100, repeat=5))/100
+        for name, function in predictions.items()}
+    
+    print(
+        f"{size} observations: "
+        + ", ".join(f"{k}: {1e3*v:.2f} ms" for k, v in durations.items()))
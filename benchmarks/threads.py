@@ -0,0 +1,34 @@
+# Scaling of the sampling time with the number of threads per chain, using the
+# reduce_sum variant of the univariate sampler
+
+import os
+import time
+
+import numpy
+import pandas
+import slimp
+
+N = 200_000
+chains = 4
+threads = [1, 2, 4, 8]
+
+generator = numpy.random.default_rng(42)
+x, y = generator.uniform(0, 10, (2, N))
+z = 10 + x + 2*y + generator.normal(0, 2, N)
+data = pandas.DataFrame({"x": x, "y": y, "z": z})
+
+print(f"{os.cpu_count()} CPUs, {chains} chains, {N} observations")
+
+durations = {}
+for threads_per_chain in threads:
+    model = slimp.Model(
+        "z ~ 1 + x + y", data, seed=42, num_chains=chains,
+        threads_per_chain=threads_per_chain)
+    start = time.perf_counter()
+    model.sample()
+    durations[threads_per_chain] = time.perf_counter() - start
+    
+    print(
+        f"{threads_per_chain} thread(s) per chain: "
+        f"{durations[threads_per_chain]:.2f} s "
+        f"({durations[threads[0]]/durations[threads_per_chain]:.1f}×)")
@@ -15,7 +15,10 @@
 
 PYBIND11_MODULE(my_model, module)
 {
-    module.def("sample", &slimp::sample<my_model::model>);
+    module.def(
+        "sample", &slimp::sample<my_model::model>,
+        pybind11::arg("data"), pybind11::arg("parameters"),
+        pybind11::arg("warm_start")=pybind11::none());
     module.def(
         "generate_quantities", &slimp::generate_quantities<my_model::model>);
 }
@@ -1,9 +1,14 @@
+import os
+
 import matplotlib.pyplot
 import numpy
 import pandas
 import slimp
+import slimp.compile
 
-import my_model
+# Compiled on first run, then re-used from the cache until the model changes
+my_model = slimp.compile.build_model(
+    os.path.join(os.path.dirname(__file__), "my_model.stan"))
 
 y, x = numpy.mgrid[0:10, 0:10]
 z = 10 + x + 2*y + numpy.random.normal(0, 2, (10, 10))
@@ -41,11 +41,15 @@ class BuildCMake(setuptools.Command, setuptools.command.build.SubCommand):
                         f"{os.path.join(here, self.build_lib, 'slimp')}", 
                     "-S", here, "-B", build_dir])
             
+            # NOTE: the core module and the module of each model family are
+            # independent targets, built in parallel
+            families = ["multilevel", "multivariate", "univariate"]
+            targets = ["libslimp", "pyslimp", *[f"py{x}" for x in families]]
             subprocess.check_call(
                 [
                     "cmake", "--build", build_dir,
-                    "--target", "libslimp", "--target", "pyslimp",
-                    "--config", "Release", "--parallel"])
+                    *[x for target in targets for x in ["--target", target]],
+                    "--config", "Release", "--parallel", str(os.cpu_count())])
     
     def get_source_files(self):
         return self.sources
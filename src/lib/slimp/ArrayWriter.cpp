@@ -1,7 +1,9 @@
 #include "ArrayWriter.h"
 
+#include <array>
 #include <cstdint>
 #include <string>
+#include <utility>
 #include <vector>
 
 // WARNING: Stan must be included before Eigen so that the plugin system is
@@ -23,9 +25,33 @@
 namespace slimp
 {
 
+ArrayWriter::View
+ArrayWriter
+::view(Array & array)
+{
+    return ArrayWriter::view(
+        array.data(), {array.shape(0), array.shape(1), array.shape(2)});
+}
+
+ArrayWriter::View
+ArrayWriter
+::view(double * data, std::array<std::size_t, 3> const & shape)
+{
+    return xt::adapt(
+        data, shape[0]*shape[1]*shape[2], xt::no_ownership(), shape);
+}
+
 ArrayWriter
 ::ArrayWriter(Array & array, size_t chain, size_t offset, size_t skip)
-: _array(array), _chain(chain), _offset(offset), _skip(skip), _draw(0), _names()
+: ArrayWriter(ArrayWriter::view(array), chain, offset, skip)
+{
+    // Nothing else
+}
+
+ArrayWriter
+::ArrayWriter(View array, size_t chain, size_t offset, size_t skip)
+: _array(std::move(array)), _chain(chain), _offset(offset), _skip(skip),
+    _draw(0), _names()
 {
     // Nothing else
 }
@@ -105,4 +131,11 @@ ArrayWriter
     return this->_names;
 }
 
+std::map<size_t, std::vector<std::string>> const &
+ArrayWriter
+::messages() const
+{
+    return this->_messages;
+}
+
 }
@@ -1,8 +1,11 @@
 #ifndef _f5319195_814d_49c2_8186_b46578694468
 #define _f5319195_814d_49c2_8186_b46578694468
 
+#include <array>
 #include <cstdint>
+#include <map>
 #include <string>
+#include <utility>
 #include <vector>
 
 // WARNING: Stan must be included before Eigen so that the plugin system is
@@ -30,12 +33,32 @@
 namespace slimp
 {
 
-/// @brief Stan writer to an array of shape parameters x chains x draws
+/**
+ * @brief Stan writer to an array of shape parameters x chains x draws. The
+ * array may be owned by the caller or be any contiguous, row-major buffer,
+ * e.g. a memory-mapped file.
+ */
 class SLIMP_API ArrayWriter: public stan::callbacks::writer
 {
 public:
     using Array = Tensor3d;
     
+    /// @brief Non-owning view of a contiguous, row-major buffer
+    using View = decltype(xt::adapt(
+        std::declval<double *>(), std::size_t(), xt::no_ownership(),
+        std::declval<std::array<std::size_t, 3>>()));
+    
+    /// @brief Create a view of an array
+    static View view(Array & array);
+    
+    /**
+     * @brief Create a view of a buffer
+     * @param data start of the buffer, which must remain valid as long as the
+     *             view is used
+     * @param shape parameters × chains × draws
+     */
+    static View view(double * data, std::array<std::size_t, 3> const & shape);
+    
     ArrayWriter() = delete;
     ArrayWriter(ArrayWriter const &) = delete;
     ArrayWriter(ArrayWriter &&) = default;
@@ -52,6 +75,10 @@ public:
      */
     ArrayWriter(Array & array, size_t chain, size_t offset=0, size_t skip=0);
     
+    /// @brief Create a writer to a view of an array, see the previous
+    /// constructor for the other parameters.
+    ArrayWriter(View array, size_t chain, size_t offset=0, size_t skip=0);
+    
     /// @addtogroup writer_Interface Interface of std::callbacks::writer
     /// @{
     void operator()(std::vector<std::string> const & names) override;
@@ -70,8 +97,11 @@ public:
     
     std::vector<std::string> const & names() const;
     
+    /// @brief Messages written to the writer, indexed by the draw they precede
+    std::map<size_t, std::vector<std::string>> const & messages() const;
+    
 private:
-    Array & _array;
+    View _array;
     size_t _chain, _offset, _skip, _draw;
     std::vector<std::string> _names;
     std::map<size_t, std::vector<std::string>> _messages;
@@ -1,15 +1,19 @@
 #ifndef _eb77cafa_e85b_4b8c_b57b_cb9bbabab4c6
 #define _eb77cafa_e85b_4b8c_b57b_cb9bbabab4c6
 
+#include <array>
 #include <string>
 #include <vector>
 
 #include <stan/callbacks/logger.hpp>
+#include <stan/callbacks/writer.hpp>
 #include <stan/io/var_context.hpp>
 
 #include "slimp/action_parameters.h"
+#include "slimp/ArrayWriter.h"
 #include "slimp/Logger.h"
 #include "slimp/misc.h"
+#include "slimp/WarmStart.h"
 
 namespace slimp
 {
@@ -28,17 +32,109 @@ public:
         bool transformed_parameters=true, bool generated_quantities=true) const;
     std::vector<std::string> hmc_names() const;
     
+    /// @brief Shape of the samples array, parameters × chains × draws
+    std::array<std::size_t, 3> samples_shape() const;
     Array create_samples();
     void sample(Array & array, stan::callbacks::logger && logger=Logger());
     
+    /// @brief Sample to an external buffer, e.g. a memory-mapped file
+    void sample(
+        ArrayWriter::View array, stan::callbacks::logger && logger=Logger());
+    
+    /// @brief Sample, starting each chain from the state of a previous run
+    void sample(
+        Array & array, WarmStart const & warm_start,
+        stan::callbacks::logger && logger=Logger());
+    
+    /// @brief Sample to an external buffer, starting each chain from the
+    /// state of a previous run
+    void sample(
+        ArrayWriter::View array, WarmStart const & warm_start,
+        stan::callbacks::logger && logger=Logger());
+    
+    /**
+     * @brief Inverse metric after the last call to sample, in unconstrained
+     * space: diagonal of shape chains × parameters for the diag_e and unit_e
+     * metrics, full matrix of shape chains × parameters × parameters for the
+     * dense_e metric.
+     */
+    Arrayd const & inv_metric() const;
+    
+    /**
+     * @brief Find the posterior mode with L-BFGS. If jacobian is false, the
+     * mode is the one in constrained space (i.e. a penalized maximum
+     * likelihood), otherwise the one in unconstrained space.
+     * @return Array of shape (1 + parameters) × 1 × 1, starting with lp__ and
+     *         followed by all model names
+     */
+    Array optimize(
+        bool jacobian, int iterations,
+        stan::callbacks::logger && logger=Logger());
+    
+    /**
+     * @brief Draw from the normal approximation of the posterior at a mode
+     * found by optimize(jacobian=true, ...).
+     * @return Array of shape (2 + parameters) × 1 × draws, starting with
+     *         log_p__ and log_g__ and followed by all model names
+     */
+    Array laplace(
+        Array const & mode, std::size_t draws,
+        stan::callbacks::logger && logger=Logger());
+    
+    /**
+     * @brief Draw from the multi-path Pathfinder approximation of the
+     * posterior, resampled with Pareto-smoothed importance sampling.
+     * @return Array of shape (2 + parameters) × 1 × draws, starting with
+     *         lp_approx__ and lp__ and followed by all model names
+     */
+    Array pathfinder(
+        std::size_t paths, std::size_t draws, int iterations,
+        stan::callbacks::logger && logger=Logger());
+    
     Array create_generated_quantities(Array const & draws);
     void generate(
         Array const & draws, Array & generated_quantities,
         stan::callbacks::logger && logger=Logger());
     
+    /**
+     * @brief Generate quantities and pass them, draw by draw and in order, to
+     * a writer. Only a bounded number of draws are stored at once.
+     */
+    void generate(
+        Array const & draws, stan::callbacks::writer & writer,
+        stan::callbacks::logger && logger=Logger());
+    
 private:
+    /// @brief Number of draws sharing a random number generator
+    static constexpr std::size_t _block_size = 64;
+    
+    /**
+     * @brief Number of draws generated at once when passing them to a writer.
+     * It does not depend on the number of threads, so that the memory only
+     * depends on the number of generated quantities.
+     */
+    static constexpr std::size_t _wave_size = 16*_block_size;
+    
     T _model;
     action_parameters::Sample _parameters;
+    Arrayd _inv_metric;
+    
+    void _check_draws(Array const & draws) const;
+    void _check_metric() const;
+    
+    /**
+     * @brief Generate quantities of the draws in [begin, end) (flattened
+     * chain-major) in parallel, calling callback(chain, draw, values) for each
+     * draw, with values set to nullptr if generation failed.
+     */
+    template<typename Callback>
+    void _generate(
+        Array const & draws, std::size_t begin, std::size_t end,
+        stan::callbacks::logger & logger, Callback callback);
+    
+    void _read_inv_metric(
+        std::vector<ArrayWriter> const & writers,
+        WarmStart const * warm_start=nullptr);
 };
 
 }
@@ -3,19 +3,41 @@
 
 #include "Model.h"
 
+#include <algorithm>
+#include <array>
 #include <iostream>
+#include <limits>
+#include <sstream>
 #include <stdexcept>
 #include <string>
+#include <type_traits>
+#include <utility>
 #include <vector>
 
+#include <oneapi/tbb/parallel_for.h>
+#include <stan/callbacks/writer.hpp>
 #include <stan/callbacks/interrupt.hpp>
+#include <stan/callbacks/structured_writer.hpp>
+#include <stan/io/array_var_context.hpp>
 #include <stan/io/var_context.hpp>
 #include <stan/io/empty_var_context.hpp>
+#include <stan/services/optimize/laplace_sample.hpp>
+#include <stan/services/optimize/lbfgs.hpp>
+#include <stan/services/pathfinder/multi.hpp>
+#include <stan/services/sample/hmc_nuts_dense_e_adapt.hpp>
+#include <stan/services/sample/hmc_nuts_diag_e.hpp>
 #include <stan/services/sample/hmc_nuts_diag_e_adapt.hpp>
-#include <stan/services/sample/standalone_gqs.hpp>
+#include <stan/services/sample/hmc_nuts_unit_e_adapt.hpp>
+#include <stan/services/util/create_rng.hpp>
+#if __has_include(<xtensor/xtensor.hpp>)
+#include <xtensor/xview.hpp>
+#else
+#include <xtensor/views/xview.hpp>
+#endif
 
 #include "slimp/action_parameters.h"
 #include "slimp/ArrayWriter.h"
+#include "slimp/WarmStart.h"
 
 namespace slimp
 {
@@ -58,9 +80,9 @@ Model<T>
 }
 
 template<typename T>
-typename Model<T>::Array
+std::array<std::size_t, 3>
 Model<T>
-::create_samples()
+::samples_shape() const
 {
     size_t const num_samples = 
         this->_parameters.num_samples
@@ -69,10 +91,17 @@ Model<T>
     size_t const thinned_samples = 
         num_samples / this->_parameters.thin
         +((num_samples%this->_parameters.thin == 0)?0:1);
-    Array array(Array::shape_type{
+    return {
         this->hmc_names().size() + this->model_names().size(),
-        this->_parameters.num_chains, thinned_samples});
-    
+        this->_parameters.num_chains, thinned_samples};
+}
+
+template<typename T>
+typename Model<T>::Array
+Model<T>
+::create_samples()
+{
+    Array array(this->samples_shape());
     return array;
 }
 
@@ -80,6 +109,24 @@ template<typename T>
 void
 Model<T>
 ::sample(Array & array, stan::callbacks::logger && logger)
+{
+    this->sample(ArrayWriter::view(array), std::move(logger));
+}
+
+template<typename T>
+void
+Model<T>
+::sample(
+    Array & array, WarmStart const & warm_start,
+    stan::callbacks::logger && logger)
+{
+    this->sample(ArrayWriter::view(array), warm_start, std::move(logger));
+}
+
+template<typename T>
+void
+Model<T>
+::sample(ArrayWriter::View array, stan::callbacks::logger && logger)
 {
     stan::callbacks::interrupt interrupt;
     
@@ -101,13 +148,16 @@ Model<T>
     
     std::vector<stan::callbacks::writer> diagnostic_writers(num_chains);
     
-    if(parameters.sequential_chains)
-    {
-        for(std::size_t chain=0; chain!=num_chains; ++chain)
+    this->_check_metric();
+    
+    // Single-chain services, available for all metrics
+    auto const run_chain = [&](std::size_t chain, unsigned int chain_id) {
+        int return_code;
+        if(parameters.metric == "diag_e")
         {
-            auto const return_code = stan::services::sample::hmc_nuts_diag_e_adapt(
+            return_code = stan::services::sample::hmc_nuts_diag_e_adapt(
                 this->_model, *init_contexts[chain], parameters.seed,
-                chain, parameters.init_radius, parameters.num_warmup,
+                chain_id, parameters.init_radius, parameters.num_warmup,
                 parameters.num_samples, parameters.thin, parameters.save_warmup,
                 parameters.refresh, parameters.hmc.stepsize,
                 parameters.hmc.stepsize_jitter, parameters.hmc.max_depth,
@@ -115,14 +165,48 @@ Model<T>
                 parameters.adapt.t0, parameters.adapt.init_buffer,
                 parameters.adapt.term_buffer, parameters.adapt.window, interrupt,
                 logger, init_writers[chain], sample_writers[chain], diagnostic_writers[chain]);
-            if(return_code != 0)
-            {
-                throw std::runtime_error(
-                    "Error while sampling: "+std::to_string(return_code));
-            }
+        }
+        else if(parameters.metric == "dense_e")
+        {
+            return_code = stan::services::sample::hmc_nuts_dense_e_adapt(
+                this->_model, *init_contexts[chain], parameters.seed,
+                chain_id, parameters.init_radius, parameters.num_warmup,
+                parameters.num_samples, parameters.thin, parameters.save_warmup,
+                parameters.refresh, parameters.hmc.stepsize,
+                parameters.hmc.stepsize_jitter, parameters.hmc.max_depth,
+                parameters.adapt.delta, parameters.adapt.gamma, parameters.adapt.kappa,
+                parameters.adapt.t0, parameters.adapt.init_buffer,
+                parameters.adapt.term_buffer, parameters.adapt.window, interrupt,
+                logger, init_writers[chain], sample_writers[chain], diagnostic_writers[chain]);
+        }
+        else
+        {
+            // NOTE: only the step size is adapted with the unit metric
+            return_code = stan::services::sample::hmc_nuts_unit_e_adapt(
+                this->_model, *init_contexts[chain], parameters.seed,
+                chain_id, parameters.init_radius, parameters.num_warmup,
+                parameters.num_samples, parameters.thin, parameters.save_warmup,
+                parameters.refresh, parameters.hmc.stepsize,
+                parameters.hmc.stepsize_jitter, parameters.hmc.max_depth,
+                parameters.adapt.delta, parameters.adapt.gamma, parameters.adapt.kappa,
+                parameters.adapt.t0, interrupt,
+                logger, init_writers[chain], sample_writers[chain], diagnostic_writers[chain]);
+        }
+        if(return_code != 0)
+        {
+            throw std::runtime_error(
+                "Error while sampling: "+std::to_string(return_code));
+        }
+    };
+    
+    if(parameters.sequential_chains)
+    {
+        for(std::size_t chain=0; chain!=num_chains; ++chain)
+        {
+            run_chain(chain, chain);
         }
     }
-    else
+    else if(parameters.metric == "diag_e")
     {
         pybind11::gil_scoped_release release_gil;
         
@@ -142,6 +226,262 @@ Model<T>
                 "Error while sampling: "+std::to_string(return_code));
         }
     }
+    else
+    {
+        pybind11::gil_scoped_release release_gil;
+        
+        // NOTE: there is no multi-chain service for the unit metric, use the
+        // single-chain services for all non-diagonal metrics.
+        oneapi::tbb::parallel_for(0UL, num_chains, [&](std::size_t chain) {
+            run_chain(chain, parameters.id+chain);
+        });
+    }
+    
+    this->_read_inv_metric(sample_writers);
+}
+
+template<typename T>
+void
+Model<T>
+::sample(
+    ArrayWriter::View array, WarmStart const & warm_start,
+    stan::callbacks::logger && logger)
+{
+    stan::callbacks::interrupt interrupt;
+    
+    auto const & parameters = this->_parameters;
+    auto const & num_chains = parameters.num_chains;
+    
+    this->_check_metric();
+    if(parameters.metric != "diag_e")
+    {
+        throw std::runtime_error("Warm start requires the diag_e metric");
+    }
+    
+    // Names and shapes of the model parameters, used to build the initial
+    // values from the flattened draws of the previous run
+    std::vector<std::string> names;
+    this->_model.get_param_names(names, false, false);
+    std::vector<std::vector<size_t>> dims;
+    this->_model.get_dims(dims, false, false);
+    
+    if(
+        warm_start.stepsize.size() == 0
+        || warm_start.init.shape(0) != warm_start.stepsize.size()
+        || warm_start.inv_metric.shape(0) != warm_start.stepsize.size())
+    {
+        throw std::runtime_error("Warm start must contain at least one chain");
+    }
+    if(warm_start.init.shape(1) != this->model_names(false, false).size())
+    {
+        throw std::runtime_error(
+            "Warm start does not match the model parameters");
+    }
+    if(warm_start.inv_metric.shape(1) != this->_model.num_params_r())
+    {
+        throw std::runtime_error(
+            "Warm start does not match the model unconstrained parameters");
+    }
+    
+    std::vector<ArrayWriter> sample_writers;
+    for(size_t i=0; i!=num_chains; ++i)
+    {
+        sample_writers.emplace_back(array, i);
+    }
+    
+    auto const run_chain = [&](std::size_t chain, unsigned int chain_id) {
+        // NOTE: re-use the previous chains cyclically if there are not enough
+        auto const source = chain % warm_start.stepsize.size();
+        
+        auto const init_row = xt::view(warm_start.init, source);
+        stan::io::array_var_context const init_context(
+            names, std::vector<double>{init_row.begin(), init_row.end()}, dims);
+        
+        auto const inv_metric_row = xt::view(warm_start.inv_metric, source);
+        stan::io::array_var_context const inv_metric_context(
+            {"inv_metric"},
+            std::vector<double>{inv_metric_row.begin(), inv_metric_row.end()},
+            {{inv_metric_row.size()}});
+        
+        stan::callbacks::writer init_writer, diagnostic_writer;
+        
+        int return_code;
+        if(parameters.num_warmup == 0)
+        {
+            // No warmup: keep the adapted step size and metric as they are
+            return_code = stan::services::sample::hmc_nuts_diag_e(
+                this->_model, init_context, inv_metric_context,
+                parameters.seed, chain_id, parameters.init_radius,
+                parameters.num_warmup, parameters.num_samples, parameters.thin,
+                parameters.save_warmup, parameters.refresh,
+                warm_start.stepsize[source], parameters.hmc.stepsize_jitter,
+                parameters.hmc.max_depth, interrupt, logger, init_writer,
+                sample_writers[chain], diagnostic_writer);
+        }
+        else
+        {
+            return_code = stan::services::sample::hmc_nuts_diag_e_adapt(
+                this->_model, init_context, inv_metric_context,
+                parameters.seed, chain_id, parameters.init_radius,
+                parameters.num_warmup, parameters.num_samples, parameters.thin,
+                parameters.save_warmup, parameters.refresh,
+                warm_start.stepsize[source], parameters.hmc.stepsize_jitter,
+                parameters.hmc.max_depth, parameters.adapt.delta,
+                parameters.adapt.gamma, parameters.adapt.kappa,
+                parameters.adapt.t0, parameters.adapt.init_buffer,
+                parameters.adapt.term_buffer, parameters.adapt.window,
+                interrupt, logger, init_writer, sample_writers[chain],
+                diagnostic_writer);
+        }
+        if(return_code != 0)
+        {
+            throw std::runtime_error(
+                "Error while sampling: "+std::to_string(return_code));
+        }
+    };
+    
+    if(parameters.sequential_chains)
+    {
+        for(std::size_t chain=0; chain!=num_chains; ++chain)
+        {
+            run_chain(chain, chain);
+        }
+    }
+    else
+    {
+        pybind11::gil_scoped_release release_gil;
+        
+        // NOTE: the per-chain step size is not available in the multi-chain
+        // service, run the single-chain service on each chain.
+        oneapi::tbb::parallel_for(0UL, num_chains, [&](std::size_t chain) {
+            run_chain(chain, parameters.id+chain);
+        });
+    }
+    
+    this->_read_inv_metric(sample_writers, &warm_start);
+}
+
+template<typename T>
+Arrayd const &
+Model<T>
+::inv_metric() const
+{
+    return this->_inv_metric;
+}
+
+template<typename T>
+typename Model<T>::Array
+Model<T>
+::optimize(bool jacobian, int iterations, stan::callbacks::logger && logger)
+{
+    stan::callbacks::interrupt interrupt;
+    auto const & parameters = this->_parameters;
+    
+    Array array(Array::shape_type{1+this->model_names().size(), 1, 1});
+    
+    stan::io::empty_var_context init_context;
+    stan::callbacks::writer init_writer;
+    ArrayWriter parameter_writer(array, 0);
+    
+    // NOTE: the tolerances are the defaults of CmdStan
+    auto const run = [&](auto jacobian_) {
+        return stan::services::optimize::lbfgs<T, decltype(jacobian_)::value>(
+            this->_model, init_context, parameters.seed, parameters.id,
+            parameters.init_radius, 5, 0.001, 1e-12, 1e4, 1e-8, 1e7, 1e-8,
+            iterations, false, parameters.refresh, interrupt, logger,
+            init_writer, parameter_writer);
+    };
+    
+    pybind11::gil_scoped_release release_gil;
+    
+    auto const return_code = 
+        jacobian ? run(std::true_type()) : run(std::false_type());
+    if(return_code != 0)
+    {
+        throw std::runtime_error(
+            "Error while optimizing: "+std::to_string(return_code));
+    }
+    
+    return array;
+}
+
+template<typename T>
+typename Model<T>::Array
+Model<T>
+::laplace(
+    Array const & mode, std::size_t draws, stan::callbacks::logger && logger)
+{
+    stan::callbacks::interrupt interrupt;
+    auto const & parameters = this->_parameters;
+    
+    // Constrained values of the model parameters, after lp__
+    Eigen::VectorXd theta_hat(this->model_names(false, false).size());
+    for(Eigen::Index index=0; index!=theta_hat.size(); ++index)
+    {
+        theta_hat[index] = mode(1+index, 0, 0);
+    }
+    
+    Array array(Array::shape_type{2+this->model_names().size(), 1, draws});
+    ArrayWriter sample_writer(array, 0);
+    
+    pybind11::gil_scoped_release release_gil;
+    
+#if STAN_MAJOR < 2 || STAN_MAJOR == 2 && STAN_MINOR < 34
+    stan::services::laplace_sample<true>(
+        this->_model, theta_hat, draws, parameters.seed, parameters.refresh,
+        interrupt, logger, sample_writer);
+#else
+    stan::services::laplace_sample<true>(
+        this->_model, theta_hat, draws, true, parameters.seed,
+        parameters.refresh, interrupt, logger, sample_writer);
+#endif
+    
+    return array;
+}
+
+template<typename T>
+typename Model<T>::Array
+Model<T>
+::pathfinder(
+    std::size_t paths, std::size_t draws, int iterations,
+    stan::callbacks::logger && logger)
+{
+    stan::callbacks::interrupt interrupt;
+    auto const & parameters = this->_parameters;
+    
+    std::vector<std::shared_ptr<stan::io::var_context>> init_contexts;
+    for(std::size_t path=0; path!=paths; ++path)
+    {
+        init_contexts.push_back(std::make_shared<stan::io::empty_var_context>());
+    }
+    
+    // NOTE: only the PSIS-resampled draws are kept, the single paths are
+    // discarded
+    std::vector<stan::callbacks::writer> init_writers(paths);
+    std::vector<stan::callbacks::writer> single_path_parameter_writers(paths);
+    std::vector<stan::callbacks::structured_writer>
+        single_path_diagnostic_writers(paths);
+    
+    Array array(Array::shape_type{2+this->model_names().size(), 1, draws});
+    ArrayWriter parameter_writer(array, 0);
+    stan::callbacks::writer diagnostic_writer;
+    
+    pybind11::gil_scoped_release release_gil;
+    
+    // NOTE: the L-BFGS and ELBO parameters are the defaults of CmdStan
+    auto const return_code = stan::services::pathfinder::pathfinder_lbfgs_multi(
+        this->_model, init_contexts, parameters.seed, parameters.id,
+        parameters.init_radius, 5, 0.001, 1e-12, 1e4, 1e-8, 1e7, 1e-8,
+        iterations, 25, 1000, draws, paths, false, parameters.refresh,
+        interrupt, logger, init_writers, single_path_parameter_writers,
+        single_path_diagnostic_writers, parameter_writer, diagnostic_writer);
+    if(return_code != 0)
+    {
+        throw std::runtime_error(
+            "Error while running Pathfinder: "+std::to_string(return_code));
+    }
+    
+    return array;
 }
 
 template<typename T>
@@ -165,39 +505,226 @@ Model<T>
     Array const & draws, Array & generated_quantities,
     stan::callbacks::logger && logger)
 {
-    stan::callbacks::interrupt interrupt;
+    this->_check_draws(draws);
     
-    std::vector<std::string> model_names;
-    this->_model.constrained_param_names(model_names, false, false);
+    pybind11::gil_scoped_release release_gil;
     
-    // WARNING: the copy to draws_array is mandated by the Stan API (not
-    // possible to use Eigen::Ref or Eigen::Map)
-    std::vector<Eigen::MatrixXd> draws_array;
-    std::vector<ArrayWriter> writers;
-    for(size_t chain=0; chain!=draws.shape(1); ++chain)
+    this->_generate(
+        draws, 0, draws.shape(1)*draws.shape(2), logger,
+        [&](std::size_t chain, std::size_t draw, double const * values) {
+            for(
+                std::size_t quantity=0;
+                quantity!=generated_quantities.shape(0); ++quantity)
+            {
+                generated_quantities.unchecked(quantity, chain, draw) =
+                    values != nullptr
+                    ? values[quantity]
+                    : std::numeric_limits<double>::quiet_NaN();
+            }
+        });
+}
+
+template<typename T>
+void
+Model<T>
+::generate(
+    Array const & draws, stan::callbacks::writer & writer,
+    stan::callbacks::logger && logger)
+{
+    this->_check_draws(draws);
+    
+    auto const model_names = this->model_names(false, false);
+    auto const gq_names = this->model_names(false, true);
+    writer(std::vector<std::string>{
+        gq_names.begin()+model_names.size(), gq_names.end()});
+    auto const quantities = gq_names.size()-model_names.size();
+    
+    pybind11::gil_scoped_release release_gil;
+    
+    // NOTE: the draws are generated in parallel by waves of blocks, and only
+    // the current wave is stored before being passed in order to the writer.
+    auto const total = draws.shape(1)*draws.shape(2);
+    auto const wave = std::min(total, Model::_wave_size);
+    Tensor2d buffer(Tensor2d::shape_type{wave, quantities});
+    std::vector<double> state(quantities);
+    
+    for(std::size_t begin=0; begin<total; begin+=wave)
     {
-        draws_array.emplace_back(draws.shape(2), draws.shape(0));
-        auto & destination = draws_array.back();
-        for(std::size_t parameter=0; parameter!=draws.shape(0); ++parameter)
+        auto const end = std::min(total, begin+wave);
+        this->_generate(
+            draws, begin, end, logger,
+            [&](std::size_t chain, std::size_t draw, double const * values) {
+                auto const row = chain*draws.shape(2)+draw-begin;
+                for(std::size_t quantity=0; quantity!=quantities; ++quantity)
+                {
+                    buffer.unchecked(row, quantity) =
+                        values != nullptr
+                        ? values[quantity]
+                        : std::numeric_limits<double>::quiet_NaN();
+                }
+            });
+        
+        for(std::size_t row=0; row!=end-begin; ++row)
+        {
+            std::copy(
+                &buffer.unchecked(row, 0), &buffer.unchecked(row, 0)+quantities,
+                state.begin());
+            writer(state);
+        }
+    }
+}
+
+template<typename T>
+void
+Model<T>
+::_check_draws(Array const & draws) const
+{
+    auto const parameters_count = this->model_names(false, false).size();
+    if(draws.shape(0) != parameters_count)
+    {
+        throw std::runtime_error(
+            "Draws do not match the model parameters: expected "
+            +std::to_string(parameters_count)+", got "
+            +std::to_string(draws.shape(0)));
+    }
+}
+
+template<typename T>
+void
+Model<T>
+::_check_metric() const
+{
+    auto const & metric = this->_parameters.metric;
+    if(metric != "diag_e" && metric != "dense_e" && metric != "unit_e")
+    {
+        throw std::runtime_error("Unknown metric: "+metric);
+    }
+}
+
+template<typename T>
+template<typename Callback>
+void
+Model<T>
+::_generate(
+    Array const & draws, std::size_t begin, std::size_t end,
+    stan::callbacks::logger & logger, Callback callback)
+{
+    auto const parameters_count = draws.shape(0);
+    auto const draws_count = draws.shape(2);
+    
+    // NOTE: the draws are split in fixed-size blocks, each with its own RNG,
+    // so that the results do not depend on the scheduling of the blocks.
+    auto const first_block = begin/Model::_block_size;
+    auto const last_block = (end+Model::_block_size-1)/Model::_block_size;
+    
+    oneapi::tbb::parallel_for(first_block, last_block, [&](std::size_t block) {
+        auto rng = stan::services::util::create_rng(
+            this->_parameters.seed, 1+block);
+        
+        // NOTE: the draws are read in place, only the current one is copied
+        // as mandated by the Stan API.
+        Eigen::VectorXd constrained(parameters_count), unconstrained, values;
+        for(
+            auto index=block*Model::_block_size;
+            index!=std::min(end, (block+1)*Model::_block_size); ++index)
         {
-            for(std::size_t draw=0; draw!=draws.shape(2); ++draw)
+            auto const chain = index / draws_count;
+            auto const draw = index % draws_count;
+            
+            for(std::size_t parameter=0; parameter!=parameters_count; ++parameter)
+            {
+                constrained[parameter] = draws.unchecked(parameter, chain, draw);
+            }
+            
+            std::stringstream messages;
+            try
             {
-                destination(draw, parameter) = draws(parameter, chain, draw);
+                this->_model.unconstrain_array(
+                    constrained, unconstrained, &messages);
+                this->_model.write_array(
+                    rng, unconstrained, values, false, true, &messages);
+                callback(chain, draw, values.data()+parameters_count);
+            }
+            catch(std::exception & e)
+            {
+                if(messages.str().length() > 0)
+                {
+                    logger.info(messages);
+                }
+                logger.info(e.what());
+                callback(chain, draw, nullptr);
             }
         }
-        writers.emplace_back(
-            generated_quantities, chain, 0UL, model_names.size());
-    }
+    });
+}
+
+template<typename T>
+void
+Model<T>
+::_read_inv_metric(
+    std::vector<ArrayWriter> const & writers, WarmStart const * warm_start)
+{
+    auto const size = this->_model.num_params_r();
+    auto const & metric = this->_parameters.metric;
     
-    pybind11::gil_scoped_release release_gil;
+    // NOTE: the diagonal metric has one row, the dense metric has one row per
+    // parameter. The unit metric is not adapted and is not reported.
+    auto const rows = (metric == "dense_e") ? size : 1;
+    if(metric == "dense_e")
+    {
+        this->_inv_metric = Arrayd::from_shape({writers.size(), size, size});
+    }
+    else
+    {
+        this->_inv_metric = Arrayd::from_shape({writers.size(), size});
+    }
+    this->_inv_metric.fill(
+        metric == "unit_e" ? 1. : std::numeric_limits<double>::quiet_NaN());
     
-    auto const return_code = stan::services::standalone_generate(
-        this->_model, draws.shape(1), draws_array, this->_parameters.seed,
-        interrupt, logger, writers);
-    if(return_code != 0)
+    // NOTE: the adapted metric is only reported as messages to the sample
+    // writer, as a header line followed by lines of comma-separated values.
+    for(std::size_t chain=0; chain!=writers.size(); ++chain)
     {
-        throw std::runtime_error(
-            "Error while sampling: "+std::to_string(return_code));
+        auto * const destination = 
+            this->_inv_metric.data() + chain*rows*size;
+        bool found = false;
+        std::size_t row = rows;
+        for(auto && [draw, messages]: writers[chain].messages())
+        {
+            for(auto && message: messages)
+            {
+                if(row != rows)
+                {
+                    std::istringstream stream(message);
+                    std::string value;
+                    for(
+                        std::size_t index=0;
+                        index != size && std::getline(stream, value, ',');
+                        ++index)
+                    {
+                        destination[row*size+index] = std::stod(value);
+                    }
+                    ++row;
+                    found = true;
+                }
+                else if(
+                    message == "Diagonal elements of inverse mass matrix:"
+                    || message == "Elements of inverse mass matrix:")
+                {
+                    row = 0;
+                }
+            }
+        }
+        
+        // Sampling without adaptation does not report the metric: it is the
+        // one from the warm start
+        if(!found && warm_start != nullptr)
+        {
+            auto const source = chain % warm_start->inv_metric.shape(0);
+            auto const inv_metric_row = xt::view(warm_start->inv_metric, source);
+            std::copy(
+                inv_metric_row.begin(), inv_metric_row.end(), destination);
+        }
     }
 }
 
@@ -0,0 +1,311 @@
+#include "SummaryWriter.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <limits>
+#include <string>
+#include <vector>
+
+// WARNING: Stan must be included before Eigen so that the plugin system is
+// active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+#include <stan/math.hpp>
+
+#include <Eigen/Dense>
+#include <stan/callbacks/writer.hpp>
+
+namespace slimp
+{
+
+SummaryWriter
+::SummaryWriter(std::vector<double> const & probabilities, size_t skip)
+: _probabilities(probabilities), _skip(skip), _count(0), _names(), _mean(),
+    _m2(), _quantiles()
+{
+    // Nothing else
+}
+
+void
+SummaryWriter
+::operator()(std::vector<std::string> const & names)
+{
+    // NOTE: names are informative, don't check their size
+    this->_names = names;
+}
+
+void
+SummaryWriter
+::operator()(std::vector<double> const & state)
+{
+    this->_write(state.data(), state.size());
+}
+
+void
+SummaryWriter
+::operator()(std::string const &)
+{
+    // Nothing to do
+}
+
+void
+SummaryWriter
+#if STAN_MAJOR < 2 || STAN_MAJOR == 2 && STAN_MINOR <= 36
+::operator()(Eigen::Ref<Eigen::Matrix<double, -1, -1>> const & values)
+#else
+::operator()(Eigen::Matrix<double, -1, -1> const & values)
+#endif
+{
+    // From Stan documentation, "The input is expected to have parameters in the
+    // rows and samples in the columns". The matrix is column-major, each draw
+    // is then contiguous.
+    for(Eigen::Index draw=0; draw!=values.cols(); ++draw)
+    {
+        this->_write(values.col(draw).data(), values.rows());
+    }
+}
+
+#if !(STAN_MAJOR < 2 || STAN_MAJOR == 2 && STAN_MINOR <= 36)
+void
+SummaryWriter
+::operator()(Eigen::Matrix<double, -1, 1> const & values)
+{
+    this->_write(values.data(), values.size());
+}
+
+void
+SummaryWriter
+::operator()(Eigen::Matrix<double, 1, -1> const & values)
+{
+    this->_write(values.data(), values.size());
+}
+#endif
+
+std::vector<std::string> const &
+SummaryWriter
+::names() const
+{
+    return this->_names;
+}
+
+size_t
+SummaryWriter
+::count() const
+{
+    return this->_count;
+}
+
+Tensor1d
+SummaryWriter
+::mean() const
+{
+    Tensor1d result(Tensor1d::shape_type{this->_mean.size()});
+    std::copy(this->_mean.begin(), this->_mean.end(), result.begin());
+    return result;
+}
+
+Tensor1d
+SummaryWriter
+::sd() const
+{
+    Tensor1d result(Tensor1d::shape_type{this->_m2.size()});
+    std::transform(
+        this->_m2.begin(), this->_m2.end(), result.begin(),
+        [&](double m2) { return std::sqrt(m2/this->_count); });
+    return result;
+}
+
+Tensor2d
+SummaryWriter
+::quantiles() const
+{
+    auto const columns = this->_mean.size();
+    auto const probabilities = this->_probabilities.size();
+    
+    Tensor2d result(Tensor2d::shape_type{columns, probabilities});
+    for(size_t column=0; column!=columns; ++column)
+    {
+        for(size_t probability=0; probability!=probabilities; ++probability)
+        {
+            // NOTE: the P² estimator does not propagate NaN, use the mean
+            result(column, probability) =
+                std::isnan(this->_mean[column])
+                ? std::numeric_limits<double>::quiet_NaN()
+                : this->_quantiles[column*probabilities+probability].value();
+        }
+    }
+    return result;
+}
+
+void
+SummaryWriter
+::_write(double const * values, size_t size)
+{
+    auto const columns = size-this->_skip;
+    if(this->_count == 0)
+    {
+        this->_mean.assign(columns, 0.);
+        this->_m2.assign(columns, 0.);
+        this->_quantiles.clear();
+        this->_quantiles.reserve(columns*this->_probabilities.size());
+        for(size_t column=0; column!=columns; ++column)
+        {
+            for(auto && probability: this->_probabilities)
+            {
+                this->_quantiles.emplace_back(probability);
+            }
+        }
+    }
+    else if(columns != this->_mean.size())
+    {
+        throw std::runtime_error(
+            "Mismatched number of columns: expected "
+            +std::to_string(this->_mean.size())+", got "
+            +std::to_string(columns));
+    }
+    
+    ++this->_count;
+    
+    auto const probabilities = this->_probabilities.size();
+    for(size_t column=0; column!=columns; ++column)
+    {
+        auto const value = values[this->_skip+column];
+        
+        auto const delta = value - this->_mean[column];
+        this->_mean[column] += delta/this->_count;
+        this->_m2[column] += delta*(value - this->_mean[column]);
+        
+        for(size_t probability=0; probability!=probabilities; ++probability)
+        {
+            this->_quantiles[column*probabilities+probability](value);
+        }
+    }
+}
+
+SummaryWriter::P2
+::P2(double probability)
+: _probability(probability), _count(0), _heights{},
+    _positions{1, 2, 3, 4, 5},
+    _desired{1, 1+2*probability, 1+4*probability, 3+2*probability, 5},
+    _increments{0, probability/2, probability, (1+probability)/2, 1}
+{
+    // Nothing else
+}
+
+void
+SummaryWriter::P2
+::operator()(double value)
+{
+    auto & h = this->_heights;
+    auto & n = this->_positions;
+    
+    // The first five observations initialize the markers
+    if(this->_count < 5)
+    {
+        h[this->_count] = value;
+        ++this->_count;
+        if(this->_count == 5)
+        {
+            std::sort(h.begin(), h.end());
+        }
+        return;
+    }
+    
+    ++this->_count;
+    
+    // Find the cell containing the observation, update extreme values
+    size_t cell=0;
+    if(value < h[0])
+    {
+        h[0] = value;
+    }
+    else if(value >= h[4])
+    {
+        h[4] = value;
+        cell = 3;
+    }
+    else
+    {
+        while(value >= h[cell+1])
+        {
+            ++cell;
+        }
+    }
+    
+    // Update the actual and desired positions of the markers
+    for(size_t i=cell+1; i!=5; ++i)
+    {
+        ++n[i];
+    }
+    for(size_t i=0; i!=5; ++i)
+    {
+        this->_desired[i] += this->_increments[i];
+    }
+    
+    // Adjust the heights of the middle markers if necessary
+    for(size_t i=1; i!=4; ++i)
+    {
+        auto const d = this->_desired[i] - n[i];
+        if((d >= 1 && n[i+1]-n[i] > 1) || (d <= -1 && n[i-1]-n[i] < -1))
+        {
+            double const direction = d > 0 ? 1 : -1;
+            auto height = this->_parabolic(i, direction);
+            if(!(h[i-1] < height && height < h[i+1]))
+            {
+                height = this->_linear(i, direction);
+            }
+            h[i] = height;
+            n[i] += direction;
+        }
+    }
+}
+
+double
+SummaryWriter::P2
+::value() const
+{
+    if(this->_count == 0)
+    {
+        return std::numeric_limits<double>::quiet_NaN();
+    }
+    else if(this->_count < 5)
+    {
+        // Exact quantile, with linear interpolation
+        std::array<double, 5> sorted = this->_heights;
+        std::sort(sorted.begin(), sorted.begin()+this->_count);
+        auto const position = this->_probability*(this->_count-1);
+        auto const below = static_cast<size_t>(std::floor(position));
+        auto const above = std::min(below+1, this->_count-1);
+        return
+            sorted[below]
+            + (position-below)*(sorted[above]-sorted[below]);
+    }
+    else
+    {
+        return this->_heights[2];
+    }
+}
+
+double
+SummaryWriter::P2
+::_parabolic(size_t i, double d) const
+{
+    auto const & h = this->_heights;
+    auto const & n = this->_positions;
+    return
+        h[i]
+        + d / (n[i+1]-n[i-1]) * (
+            (n[i]-n[i-1]+d) * (h[i+1]-h[i]) / (n[i+1]-n[i])
+            + (n[i+1]-n[i]-d) * (h[i]-h[i-1]) / (n[i]-n[i-1]));
+}
+
+double
+SummaryWriter::P2
+::_linear(size_t i, double d) const
+{
+    auto const & h = this->_heights;
+    auto const & n = this->_positions;
+    auto const j = d > 0 ? i+1 : i-1;
+    return h[i] + d * (h[j]-h[i]) / (n[j]-n[i]);
+}
+
+}
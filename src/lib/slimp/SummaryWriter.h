@@ -0,0 +1,106 @@
+#ifndef _6d2a9e41_07c3_4b5f_8e1d_3f9a2c7b5e60
+#define _6d2a9e41_07c3_4b5f_8e1d_3f9a2c7b5e60
+
+#include <array>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// WARNING: Stan must be included before Eigen so that the plugin system is
+// active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+#include <stan/math.hpp>
+
+#include <Eigen/Dense>
+#include <stan/callbacks/writer.hpp>
+#include <stan/version.hpp>
+
+#include "slimp/api.h"
+#include "slimp/misc.h"
+
+namespace slimp
+{
+
+/**
+ * @brief Stan writer which only keeps a summary of each column: mean,
+ * standard deviation and quantiles. The moments are updated with Welford's
+ * algorithm and the quantiles are estimated with the P² algorithm (Jain &
+ * Chlamtac, 1985), so that the memory does not depend on the number of draws.
+ */
+class SLIMP_API SummaryWriter: public stan::callbacks::writer
+{
+public:
+    SummaryWriter() = delete;
+    SummaryWriter(SummaryWriter const &) = default;
+    SummaryWriter(SummaryWriter &&) = default;
+    ~SummaryWriter() = default;
+    SummaryWriter & operator=(SummaryWriter const &) = default;
+    
+    /**
+     * @brief Create a writer.
+     * @param probabilities probabilities of the estimated quantiles, in [0, 1]
+     * @param skip number of parameters at the head of written data which are
+     *             skipped (used e.g. for generated quantities)
+     */
+    SummaryWriter(std::vector<double> const & probabilities, size_t skip=0);
+    
+    /// @addtogroup writer_Interface Interface of std::callbacks::writer
+    /// @{
+    void operator()(std::vector<std::string> const & names) override;
+    void operator()(std::vector<double> const & state) override;
+    void operator()(std::string const & message) override;
+    
+#if STAN_MAJOR < 2 || STAN_MAJOR == 2 && STAN_MINOR <= 36
+    void operator()(
+        Eigen::Ref<Eigen::Matrix<double, -1, -1>> const & values) override;
+#else
+    void operator()(Eigen::Matrix<double, -1, -1> const & values) override;
+    void operator()(Eigen::Matrix<double, -1, 1> const & values) override;
+    void operator()(Eigen::Matrix<double, 1, -1> const & values) override;
+#endif
+    /// @}
+    
+    std::vector<std::string> const & names() const;
+    
+    /// @brief Number of draws written to the writer
+    size_t count() const;
+    
+    /// @brief Mean of each column, shape columns
+    Tensor1d mean() const;
+    
+    /// @brief Standard deviation of each column, shape columns
+    Tensor1d sd() const;
+    
+    /// @brief Estimated quantiles of each column, shape columns × probabilities
+    Tensor2d quantiles() const;
+    
+private:
+    /// @brief Streaming estimator of a single quantile
+    class P2
+    {
+    public:
+        P2(double probability);
+        void operator()(double value);
+        double value() const;
+    private:
+        double _probability;
+        size_t _count;
+        std::array<double, 5> _heights, _positions, _desired, _increments;
+        
+        double _parabolic(size_t index, double direction) const;
+        double _linear(size_t index, double direction) const;
+    };
+    
+    std::vector<double> _probabilities;
+    size_t _skip, _count;
+    std::vector<std::string> _names;
+    std::vector<double> _mean, _m2;
+    
+    /// @brief Quantile estimators, columns-major
+    std::vector<P2> _quantiles;
+    
+    void _write(double const * values, size_t size);
+};
+
+}
+
+#endif // _6d2a9e41_07c3_4b5f_8e1d_3f9a2c7b5e60
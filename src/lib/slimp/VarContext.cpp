@@ -15,6 +15,7 @@ void
 VarContext
 ::set(std::string const & key, int x)
 {
+    this->_erase(key);
     this->_vals_i[key] = {x};
     this->_dims_i[key] = {};
 }
@@ -23,6 +24,7 @@ void
 VarContext
 ::set(std::string const & key, double x)
 {
+    this->_erase(key);
     this->_vals_r[key] = {x};
     this->_dims_r[key] = {};
 }
@@ -33,6 +35,7 @@ VarContext
 {
     return
         this->_vals_r.find(name) != this->_vals_r.end()
+        || this->_buffers_r.find(name) != this->_buffers_r.end()
         || this->contains_i(name);
 }
 
@@ -45,11 +48,20 @@ VarContext
     {
         return iterator->second;
     }
-    else
+    
+    // NOTE: buffers are read directly in their original type, without going
+    // through an intermediate integer vector.
+    for(auto && buffers: {&this->_buffers_r, &this->_buffers_i})
     {
-        auto const vals_i = this->vals_i(name);
-        return {vals_i.begin(), vals_i.end()};
+        auto const buffer = buffers->find(name);
+        if(buffer != buffers->end())
+        {
+            return buffer->second.vals_r(buffer->second);
+        }
     }
+    
+    auto const vals_i = this->vals_i(name);
+    return {vals_i.begin(), vals_i.end()};
 }
 
 std::vector<std::complex<double>>
@@ -68,17 +80,23 @@ VarContext
     {
         return iterator->second;
     }
-    else
+    
+    auto const buffer = this->_buffers_r.find(name);
+    if(buffer != this->_buffers_r.end())
     {
-        return this->dims_i(name);
+        return buffer->second.shape;
     }
+    
+    return this->dims_i(name);
 }
 
 bool
 VarContext
 ::contains_i(std::string const & name) const
 {
-    return this->_vals_i.find(name) != this->_vals_i.end();
+    return
+        this->_vals_i.find(name) != this->_vals_i.end()
+        || this->_buffers_i.find(name) != this->_buffers_i.end();
 }
 
 std::vector<int>
@@ -90,10 +108,14 @@ VarContext
     {
         return iterator->second;
     }
-    else
+    
+    auto const buffer = this->_buffers_i.find(name);
+    if(buffer != this->_buffers_i.end())
     {
-        return {};
+        return buffer->second.vals_i(buffer->second);
     }
+    
+    return {};
 }
 
 std::vector<size_t>
@@ -105,10 +127,14 @@ VarContext
     {
         return iterator->second;
     }
-    else
+    
+    auto const buffer = this->_buffers_i.find(name);
+    if(buffer != this->_buffers_i.end())
     {
-        return {};
+        return buffer->second.shape;
     }
+    
+    return {};
 }
 
 void
@@ -116,11 +142,15 @@ VarContext
 ::names_r(std::vector<std::string> & names) const
 {
     names.clear();
-    names.reserve(this->_vals_r.size());
+    names.reserve(this->_vals_r.size()+this->_buffers_r.size());
     for(auto && item: this->_vals_r)
     {
         names.push_back(item.first);
     }
+    for(auto && item: this->_buffers_r)
+    {
+        names.push_back(item.first);
+    }
 }
 
 void
@@ -128,11 +158,15 @@ VarContext
 ::names_i(std::vector<std::string> & names) const
 {
     names.clear();
-    names.reserve(this->_vals_i.size());
+    names.reserve(this->_vals_i.size()+this->_buffers_i.size());
     for(auto && item: this->_vals_i)
     {
         names.push_back(item.first);
     }
+    for(auto && item: this->_buffers_i)
+    {
+        names.push_back(item.first);
+    }
 }
 
 void
@@ -154,4 +188,31 @@ VarContext
     stan::io::validate_dims(*this, stage, name, base_type, dims_declared);
 }
 
+bool
+VarContext
+::is_column_major(std::string const & name) const
+{
+    for(auto && buffers: {&this->_buffers_r, &this->_buffers_i})
+    {
+        auto const buffer = buffers->find(name);
+        if(buffer != buffers->end())
+        {
+            return buffer->second.column_major;
+        }
+    }
+    return true;
+}
+
+void
+VarContext
+::_erase(std::string const & key)
+{
+    this->_vals_i.erase(key);
+    this->_vals_r.erase(key);
+    this->_dims_i.erase(key);
+    this->_dims_r.erase(key);
+    this->_buffers_i.erase(key);
+    this->_buffers_r.erase(key);
+}
+
 }
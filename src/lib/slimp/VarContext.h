@@ -1,7 +1,9 @@
 #ifndef _5eca19ab_3261_414f_8dd3_ce485c9e547d
 #define _5eca19ab_3261_414f_8dd3_ce485c9e547d
 
+#include <cstddef>
 #include <cstdint>
+#include <memory>
 #include <string>
 #include <unordered_map>
 #include <vector>
@@ -35,6 +37,31 @@ public:
     template<typename T, std::enable_if_t<std::is_floating_point<T>::value, bool> = true>
     void set(std::string const & key, Array<T> const & array);
     
+    /**
+     * @brief Reference an external buffer without copying it. The buffer is
+     * only copied when Stan reads it, and is transposed only if it is not
+     * stored in column-major order.
+     * @param key name of the variable
+     * @param data pointer to the first element of the buffer
+     * @param shape shape of the buffer
+     * @param strides strides of the buffer, in number of elements
+     * @param owner object keeping the buffer alive, shared by all copies of
+     *              the context
+     */
+    template<typename T>
+    void set(
+        std::string const & key, T const * data,
+        std::vector<size_t> const & shape,
+        std::vector<std::ptrdiff_t> const & strides,
+        std::shared_ptr<void const> owner={});
+    
+    /**
+     * @brief Whether a variable is stored in column-major order, i.e. if Stan
+     * reads it without transposing it. Variables which are not buffers are
+     * always column-major.
+     */
+    bool is_column_major(std::string const & name) const;
+    
     /// @addtogroup var_context_Interface Interface of std::io::var_context
     /// @{
     bool contains_r(std::string const & name) const override;
@@ -54,9 +81,30 @@ public:
     /// @}
 
 private:
+    /// @brief Non-owning view on an external buffer
+    struct Buffer
+    {
+        std::shared_ptr<void const> owner;
+        void const * data;
+        std::vector<size_t> shape;
+        std::vector<std::ptrdiff_t> strides;
+        bool column_major;
+        
+        std::vector<int> (*vals_i)(Buffer const &);
+        std::vector<double> (*vals_r)(Buffer const &);
+    };
+    
     std::unordered_map<std::string, std::vector<int>> _vals_i;
     std::unordered_map<std::string, std::vector<double>> _vals_r;
     std::unordered_map<std::string, std::vector<size_t>> _dims_i, _dims_r;
+    std::unordered_map<std::string, Buffer> _buffers_i, _buffers_r;
+    
+    /// @brief Remove a variable from all storages
+    void _erase(std::string const & key);
+    
+    /// @brief Copy the buffer to a vector in column-major order
+    template<typename Source, typename Destination>
+    static std::vector<Destination> _gather(Buffer const & buffer);
 };
 
 }
@@ -3,7 +3,11 @@
 
 #include "VarContext.h"
 
+#include <cstddef>
+#include <memory>
 #include <string>
+#include <type_traits>
+#include <vector>
 
 #include <stan/io/var_context.hpp>
 
@@ -17,6 +21,7 @@ void
 VarContext
 ::set(std::string const & key, Array<T> const & array)
 {
+    this->_erase(key);
     this->_vals_i[key] = {
         array.template begin<xt::layout_type::column_major>(),
         array.template end<xt::layout_type::column_major>()};
@@ -30,6 +35,7 @@ void
 VarContext
 ::set(std::string const & key, Array<T> const & array)
 {
+    this->_erase(key);
     this->_vals_r[key] = {
         array.template begin<xt::layout_type::column_major>(),
         array.template end<xt::layout_type::column_major>()};
@@ -38,6 +44,87 @@ VarContext
     this->_dims_r[key] = {shape.begin(), shape.end()};
 }
 
+template<typename T>
+void
+VarContext
+::set(
+    std::string const & key, T const * data,
+    std::vector<size_t> const & shape,
+    std::vector<std::ptrdiff_t> const & strides,
+    std::shared_ptr<void const> owner)
+{
+    static_assert(
+        std::is_arithmetic<T>::value, "Buffer must be integral or floating");
+    
+    this->_erase(key);
+    
+    Buffer buffer{owner, data, shape, strides, true, nullptr, nullptr};
+    
+    // Column-major if the strides are those of a Fortran-ordered array
+    std::ptrdiff_t expected_stride = 1;
+    for(std::size_t d=0; d!=shape.size(); ++d)
+    {
+        if(shape[d] > 1 && strides[d] != expected_stride)
+        {
+            buffer.column_major = false;
+        }
+        expected_stride *= shape[d];
+    }
+    
+    buffer.vals_r = &VarContext::_gather<T, double>;
+    if constexpr(std::is_integral<T>::value)
+    {
+        buffer.vals_i = &VarContext::_gather<T, int>;
+        this->_buffers_i[key] = std::move(buffer);
+    }
+    else
+    {
+        this->_buffers_r[key] = std::move(buffer);
+    }
+}
+
+template<typename Source, typename Destination>
+std::vector<Destination>
+VarContext
+::_gather(Buffer const & buffer)
+{
+    auto const data = static_cast<Source const *>(buffer.data);
+    
+    std::size_t size = 1;
+    for(auto && d: buffer.shape)
+    {
+        size *= d;
+    }
+    
+    if(buffer.column_major)
+    {
+        return {data, data+size};
+    }
+    
+    // Walk the buffer with the first index varying fastest
+    std::vector<Destination> result;
+    result.reserve(size);
+    std::vector<size_t> index(buffer.shape.size(), 0);
+    std::ptrdiff_t offset = 0;
+    for(std::size_t i=0; i!=size; ++i)
+    {
+        result.push_back(data[offset]);
+        for(std::size_t d=0; d!=index.size(); ++d)
+        {
+            ++index[d];
+            offset += buffer.strides[d];
+            if(index[d] != buffer.shape[d])
+            {
+                break;
+            }
+            offset -= index[d]*buffer.strides[d];
+            index[d] = 0;
+        }
+    }
+    
+    return result;
+}
+
 }
 
 #endif // _b1fa63f0_8b1e_42c6_bc2d_f511b5f400a4
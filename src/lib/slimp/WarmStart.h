@@ -0,0 +1,32 @@
+#ifndef _3c1f6e0a_5d8b_4e2f_9a47_81b0c2d6f915
+#define _3c1f6e0a_5d8b_4e2f_9a47_81b0c2d6f915
+
+#include "slimp/api.h"
+#include "slimp/misc.h"
+
+namespace slimp
+{
+
+/**
+ * @brief Adapted state of the chains of a previous run, used to warm-start
+ * sampling. If the previous run has less chains than the new one, its chains
+ * are re-used cyclically.
+ */
+class SLIMP_API WarmStart
+{
+public:
+    /// @brief Step size of each chain, shape chains
+    Tensor1d stepsize;
+    
+    /// @brief Diagonal of the inverse metric, in unconstrained space, shape
+    /// chains × unconstrained parameters
+    Tensor2d inv_metric;
+    
+    /// @brief Constrained value of the model parameters used to initialize
+    /// each chain, shape chains × parameters
+    Tensor2d init;
+};
+
+}
+
+#endif // _3c1f6e0a_5d8b_4e2f_9a47_81b0c2d6f915
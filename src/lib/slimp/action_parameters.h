@@ -2,6 +2,7 @@
 #define _d498d353_df89_48aa_b410_419d66b6be60
 
 #include <stddef.h>
+#include <string>
 
 #include "slimp/api.h"
 
@@ -49,6 +50,9 @@ public:
     double init_radius = 2;
     int refresh = 0;
     
+    /// @brief Metric of the NUTS sampler: "diag_e", "dense_e" or "unit_e"
+    std::string metric = "diag_e";
+    
     bool sequential_chains = false;
     unsigned int threads_per_chain = 1;
 };
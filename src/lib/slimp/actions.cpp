@@ -4,6 +4,22 @@
 // active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
 #include <stan/math.hpp>
 
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <cstdint>
+#include <limits>
+#include <memory>
+#include <numeric>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include <oneapi/tbb/blocked_range.h>
+#include <oneapi/tbb/enumerable_thread_specific.h>
+#include <oneapi/tbb/parallel_for.h>
+
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <stan/analyze/mcmc/compute_effective_sample_size.hpp>
 #include <stan/analyze/mcmc/compute_potential_scale_reduction.hpp>
@@ -15,7 +31,9 @@
 #include <xtensor/views/xview.hpp>
 #endif
 #include <xtensor-python/pyarray.hpp>
+#include <xtensor-python/pytensor.hpp>
 
+#include "slimp/Logger.h"
 #include "slimp/misc.h"
 
 namespace slimp
@@ -117,6 +135,435 @@ Tensor2d get_split_potential_scale_reduction(Tensor4d const & data)
     return wrapper(data, get_split_potential_scale_reduction);
 }
 
+Tensor2d summary(
+    Tensor3d const & draws, std::vector<double> const & probabilities)
+{
+    auto const parameters = draws.shape(0);
+    auto const chains_count = draws.shape(1);
+    auto const draws_count = draws.shape(2);
+    auto const size = chains_count*draws_count;
+    
+    Tensor2d result(
+        Tensor2d::shape_type{parameters, 4+probabilities.size()});
+    
+    // NOTE: each thread sorts the draws of a parameter in its own buffer
+    oneapi::tbb::enumerable_thread_specific<std::vector<double>> buffers(size);
+    
+    oneapi::tbb::parallel_for(
+        oneapi::tbb::blocked_range<std::size_t>(0, parameters),
+        [&](oneapi::tbb::blocked_range<std::size_t> const & range) {
+            auto & buffer = buffers.local();
+            std::vector<double const *> chains(chains_count);
+            for(auto parameter=range.begin(); parameter!=range.end(); ++parameter)
+            {
+                // WARNING: this assumes that the draws array is C-contiguous
+                auto const begin = &draws.unchecked(parameter, 0, 0);
+                std::copy(begin, begin+size, buffer.begin());
+                for(size_t chain=0; chain!=chains_count; ++chain)
+                {
+                    chains[chain] = &draws.unchecked(parameter, chain, 0);
+                }
+                
+                auto row = &result.unchecked(parameter, 0);
+                
+                double sum=0, sum_squares=0;
+                bool has_nan = false;
+                for(auto && x: buffer)
+                {
+                    sum += x;
+                    has_nan = has_nan || std::isnan(x);
+                }
+                auto const mean = sum/size;
+                for(auto && x: buffer)
+                {
+                    sum_squares += (x-mean)*(x-mean);
+                }
+                row[0] = mean;
+                row[1] = std::sqrt(sum_squares/size);
+                
+                // Quantiles with linear interpolation, as numpy.quantile
+                for(size_t index=0; index!=probabilities.size(); ++index)
+                {
+                    if(has_nan)
+                    {
+                        row[2+index] = std::numeric_limits<double>::quiet_NaN();
+                        continue;
+                    }
+                    
+                    auto const position = probabilities[index]*(size-1);
+                    auto const below = static_cast<size_t>(std::floor(position));
+                    std::nth_element(
+                        buffer.begin(), buffer.begin()+below, buffer.end());
+                    auto const low = buffer[below];
+                    auto const high =
+                        below+1 < size
+                        ? *std::min_element(buffer.begin()+below+1, buffer.end())
+                        : low;
+                    row[2+index] = low + (position-below)*(high-low);
+                }
+                
+                row[2+probabilities.size()] =
+                    stan::analyze::compute_effective_sample_size(
+                        chains, draws_count);
+                row[3+probabilities.size()] =
+                    stan::analyze::compute_split_potential_scale_reduction(
+                        chains, draws_count);
+            }
+        });
+    
+    return result;
+}
+
+namespace
+{
+
+/// @brief Replace values by the normal scores of their (average) ranks
+void rank_normalize(
+    std::vector<double> const & values, std::vector<double> & normalized,
+    std::vector<std::size_t> & order)
+{
+    auto const size = values.size();
+    
+    order.resize(size);
+    std::iota(order.begin(), order.end(), 0);
+    std::sort(
+        order.begin(), order.end(),
+        [&](std::size_t i, std::size_t j) { return values[i] < values[j]; });
+    
+    normalized.resize(size);
+    for(std::size_t begin=0, end=0; begin!=size; begin=end)
+    {
+        // Ties get the average of their 1-based ranks
+        while(end!=size && values[order[end]] == values[order[begin]])
+        {
+            ++end;
+        }
+        auto const rank = 0.5*(begin+1 + end);
+        auto const z = stan::math::inv_Phi((rank-0.375)/(size+0.25));
+        for(auto index=begin; index!=end; ++index)
+        {
+            normalized[order[index]] = z;
+        }
+    }
+}
+
+/// @brief Quantile with linear interpolation, as numpy.quantile
+double quantile(std::vector<double> values, double probability)
+{
+    auto const position = probability*(values.size()-1);
+    auto const below = static_cast<std::size_t>(std::floor(position));
+    std::nth_element(values.begin(), values.begin()+below, values.end());
+    auto const low = values[below];
+    auto const high =
+        below+1 < values.size()
+        ? *std::min_element(values.begin()+below+1, values.end())
+        : low;
+    return low + (position-below)*(high-low);
+}
+
+/// @brief Logarithm of the sum of the exponentials of values
+double log_sum_exp(std::vector<double> const & values)
+{
+    auto const max = *std::max_element(values.begin(), values.end());
+    if(!std::isfinite(max))
+    {
+        return max;
+    }
+    double sum = 0;
+    for(auto && x: values)
+    {
+        sum += std::exp(x-max);
+    }
+    return max+std::log(sum);
+}
+
+/**
+ * @brief Fit a generalized Pareto distribution to sorted, positive values
+ * (Zhang & Stephens, A New and Efficient Estimation Method for the Generalized
+ * Pareto Distribution, 2009), with the weakly informative prior on the shape
+ * used by the loo R package.
+ * @return shape and scale of the distribution
+ */
+std::pair<double, double> fit_generalized_pareto(std::vector<double> const & x)
+{
+    auto const N = x.size();
+    double const prior = 3;
+    auto const M = 30 + static_cast<std::size_t>(std::floor(std::sqrt(N)));
+    
+    // First quartile of the sample
+    auto const x_star = x[static_cast<std::size_t>(std::floor(N/4.+0.5))-1];
+    
+    std::vector<double> theta(M), log_likelihood(M);
+    for(std::size_t j=0; j!=M; ++j)
+    {
+        theta[j] = 1/x[N-1] + (1-std::sqrt(M/(j+0.5)))/prior/x_star;
+        
+        // Profile log-likelihood
+        auto const a = -theta[j];
+        double k = 0;
+        for(auto && x_i: x)
+        {
+            k += std::log1p(a*x_i);
+        }
+        k /= N;
+        log_likelihood[j] = N*(std::log(a/k)-k-1);
+    }
+    
+    auto const normalization = log_sum_exp(log_likelihood);
+    double theta_hat = 0;
+    for(std::size_t j=0; j!=M; ++j)
+    {
+        theta_hat += theta[j]*std::exp(log_likelihood[j]-normalization);
+    }
+    
+    double k = 0;
+    for(auto && x_i: x)
+    {
+        k += std::log1p(-theta_hat*x_i);
+    }
+    k /= N;
+    auto const sigma = -k/theta_hat;
+    
+    // Shrink towards 0.5
+    k = (k*N + 0.5*10)/(N+10);
+    
+    return {std::isnan(k) ? std::numeric_limits<double>::infinity() : k, sigma};
+}
+
+}
+
+Tensor2d get_rank_normalized_diagnostics(xt::pytensor<double, 3> const & draws)
+{
+    auto const parameters = draws.shape(0);
+    auto const chains_count = draws.shape(1);
+    // NOTE: with an odd number of draws, the middle one is dropped
+    auto const half = draws.shape(2)/2;
+    auto const offset = draws.shape(2)-half;
+    auto const size = 2*chains_count*half;
+    
+    Tensor2d result(Tensor2d::shape_type{parameters, 3});
+    
+    struct Buffers
+    {
+        std::vector<double> split, normalized, work;
+        std::vector<std::size_t> order;
+    };
+    oneapi::tbb::enumerable_thread_specific<Buffers> thread_buffers;
+    
+    oneapi::tbb::parallel_for(
+        oneapi::tbb::blocked_range<std::size_t>(0, parameters),
+        [&](oneapi::tbb::blocked_range<std::size_t> const & range) {
+            auto & buffers = thread_buffers.local();
+            auto & split = buffers.split;
+            auto & normalized = buffers.normalized;
+            auto & work = buffers.work;
+            split.resize(size);
+            
+            // Stan's diagnostics on the split chains, stored contiguously
+            std::vector<double const *> chains(2*chains_count);
+            auto const diagnostics = [&](std::vector<double> const & values) {
+                for(std::size_t chain=0; chain!=chains.size(); ++chain)
+                {
+                    chains[chain] = values.data()+chain*half;
+                }
+                return std::make_pair(
+                    stan::analyze::compute_potential_scale_reduction(
+                        chains, half),
+                    stan::analyze::compute_effective_sample_size(
+                        chains, half));
+            };
+            
+            for(auto parameter=range.begin(); parameter!=range.end(); ++parameter)
+            {
+                // Split the chains, reading the draws through their strides
+                bool finite = true;
+                for(std::size_t chain=0; chain!=chains_count; ++chain)
+                {
+                    for(std::size_t draw=0; draw!=half; ++draw)
+                    {
+                        auto & first = split[2*chain*half+draw];
+                        auto & second = split[(2*chain+1)*half+draw];
+                        first = draws(parameter, chain, draw);
+                        second = draws(parameter, chain, offset+draw);
+                        finite = finite
+                            && std::isfinite(first) && std::isfinite(second);
+                    }
+                }
+                
+                auto row = &result.unchecked(parameter, 0);
+                if(
+                    !finite || half < 4
+                    || std::all_of(
+                        split.begin(), split.end(),
+                        [&](double x) { return x == split[0]; }))
+                {
+                    std::fill(
+                        row, row+3, std::numeric_limits<double>::quiet_NaN());
+                    continue;
+                }
+                
+                // Bulk: rank-normalized draws
+                rank_normalize(split, normalized, buffers.order);
+                auto const bulk = diagnostics(normalized);
+                
+                // Tail: rank-normalized folded draws for Rhat, indicators of
+                // the 5% and 95% quantiles for ESS
+                auto const median = quantile(split, 0.5);
+                work.resize(size);
+                std::transform(
+                    split.begin(), split.end(), work.begin(),
+                    [&](double x) { return std::abs(x-median); });
+                rank_normalize(work, normalized, buffers.order);
+                auto const folded = diagnostics(normalized);
+                
+                double tail_ess = std::numeric_limits<double>::infinity();
+                for(auto && probability: {0.05, 0.95})
+                {
+                    auto const q = quantile(split, probability);
+                    std::transform(
+                        split.begin(), split.end(), work.begin(),
+                        [&](double x) { return x <= q ? 1. : 0.; });
+                    tail_ess = std::min(tail_ess, diagnostics(work).second);
+                }
+                
+                row[0] = std::max(bulk.first, folded.first);
+                row[1] = bulk.second;
+                row[2] = tail_ess;
+            }
+        });
+    
+    return result;
+}
+
+Tensor2d get_pointwise_loo_waic(Tensor3d const & log_likelihood)
+{
+    auto const observations = log_likelihood.shape(0);
+    auto const S = log_likelihood.shape(1)*log_likelihood.shape(2);
+    auto const tail_size = static_cast<std::size_t>(
+        std::ceil(std::min(0.2*S, 3*std::sqrt(S))));
+    
+    Tensor2d result(Tensor2d::shape_type{observations, 5});
+    
+    struct Buffers
+    {
+        std::vector<double> log_weights, tail, work;
+        std::vector<std::size_t> order;
+    };
+    oneapi::tbb::enumerable_thread_specific<Buffers> thread_buffers;
+    
+    oneapi::tbb::parallel_for(
+        oneapi::tbb::blocked_range<std::size_t>(0, observations),
+        [&](oneapi::tbb::blocked_range<std::size_t> const & range) {
+            auto & buffers = thread_buffers.local();
+            auto & log_weights = buffers.log_weights;
+            auto & tail = buffers.tail;
+            auto & work = buffers.work;
+            auto & order = buffers.order;
+            
+            for(auto observation=range.begin(); observation!=range.end(); ++observation)
+            {
+                // WARNING: this assumes that the array is C-contiguous
+                auto const ll = &log_likelihood.unchecked(observation, 0, 0);
+                
+                // Raw importance ratios, relative to their maximum
+                log_weights.resize(S);
+                for(std::size_t s=0; s!=S; ++s)
+                {
+                    log_weights[s] = -ll[s];
+                }
+                auto const max_log_weight = *std::max_element(
+                    log_weights.begin(), log_weights.end());
+                for(auto && x: log_weights)
+                {
+                    x -= max_log_weight;
+                }
+                
+                // Pareto-smoothing of the largest weights
+                auto k_hat = std::numeric_limits<double>::infinity();
+                if(tail_size >= 5 && tail_size < S)
+                {
+                    order.resize(S);
+                    std::iota(order.begin(), order.end(), 0);
+                    std::sort(
+                        order.begin(), order.end(),
+                        [&](std::size_t i, std::size_t j) {
+                            return log_weights[i] < log_weights[j]; });
+                    
+                    auto const tail_begin = S-tail_size;
+                    auto const low = log_weights[order[tail_begin]];
+                    auto const high = log_weights[order[S-1]];
+                    if(std::abs(high-low) >= std::numeric_limits<double>::epsilon()/100)
+                    {
+                        auto const exp_cutoff = std::exp(
+                            log_weights[order[tail_begin-1]]);
+                        tail.resize(tail_size);
+                        for(std::size_t i=0; i!=tail_size; ++i)
+                        {
+                            tail[i] = 
+                                std::exp(log_weights[order[tail_begin+i]])
+                                - exp_cutoff;
+                        }
+                        
+                        auto const [k, sigma] = fit_generalized_pareto(tail);
+                        k_hat = k;
+                        if(std::isfinite(k))
+                        {
+                            // Replace the tail by the quantiles of the fit
+                            for(std::size_t i=0; i!=tail_size; ++i)
+                            {
+                                auto const p = (i+0.5)/tail_size;
+                                auto const q = 
+                                    std::abs(k) > 1e-12
+                                    ? sigma*std::expm1(-k*std::log1p(-p))/k
+                                    : -sigma*std::log1p(-p);
+                                log_weights[order[tail_begin+i]] =
+                                    std::log(q+exp_cutoff);
+                            }
+                        }
+                    }
+                }
+                
+                // Truncate to the largest raw weight
+                for(auto && x: log_weights)
+                {
+                    x = std::min(x, 0.);
+                }
+                
+                auto const normalization = log_sum_exp(log_weights);
+                work.resize(S);
+                for(std::size_t s=0; s!=S; ++s)
+                {
+                    work[s] = log_weights[s]+ll[s];
+                }
+                auto const elpd_loo = log_sum_exp(work)-normalization;
+                
+                work.assign(ll, ll+S);
+                auto const lpd = log_sum_exp(work)-std::log(S);
+                
+                double mean = 0, variance = 0;
+                for(std::size_t s=0; s!=S; ++s)
+                {
+                    mean += ll[s];
+                }
+                mean /= S;
+                for(std::size_t s=0; s!=S; ++s)
+                {
+                    variance += (ll[s]-mean)*(ll[s]-mean);
+                }
+                variance /= S-1;
+                
+                auto row = &result.unchecked(observation, 0);
+                row[0] = elpd_loo;
+                row[1] = lpd-elpd_loo;
+                row[2] = k_hat;
+                row[3] = lpd-variance;
+                row[4] = variance;
+            }
+        });
+    
+    return result;
+}
+
 VarContext to_context(pybind11::dict data)
 {
     VarContext context;
@@ -134,32 +581,73 @@ VarContext to_context(pybind11::dict data)
         }
         else
         {
+            // NOTE: the context references the buffer of the array, which is
+            // kept alive (with the GIL held on release) by all copies of the
+            // context. Pandas objects usually expose a Fortran-ordered view
+            // on their data, which is what Stan expects.
+            auto array = std::shared_ptr<pybind11::array>(
+                new pybind11::array(value.cast<pybind11::array>()),
+                [](pybind11::array * array) {
+                    pybind11::gil_scoped_acquire acquire_gil;
+                    delete array; });
+            
+            std::vector<size_t> const shape{
+                array->shape(), array->shape()+array->ndim()};
+            std::vector<std::ptrdiff_t> strides(array->ndim());
+            for(std::size_t d=0; d!=strides.size(); ++d)
+            {
+                strides[d] = array->strides(d)/array->itemsize();
+            }
+            
             // https://numpy.org/doc/stable/reference/arrays.scalars.html#arrays-scalars-built-in
-            auto const dtype = value.cast<pybind11::array>().dtype().char_();
+            auto const dtype = array->dtype().char_();
             
+#define SET_BUFFER(type) \
+    context.set( \
+        key, static_cast<type const *>(array->data()), shape, strides, array)
             // Signed integer type
-            if(dtype == 'b') { context.set(key, value.cast<Arrayi8>()); }
-            else if(dtype == 'h') { context.set(key, value.cast<Arrayi16>()); }
-            else if(dtype == 'i') { context.set(key, value.cast<Arrayi32>()); }
-            else if(dtype == 'l') { context.set(key, value.cast<Arrayi64>()); }
+            if(dtype == 'b') { SET_BUFFER(int8_t); }
+            else if(dtype == 'h') { SET_BUFFER(int16_t); }
+            else if(dtype == 'i') { SET_BUFFER(int32_t); }
+            else if(dtype == 'l') { SET_BUFFER(int64_t); }
             // Unsigned integer types
-            else if(dtype == 'B') { context.set(key, value.cast<Arrayui8>()); }
-            else if(dtype == 'H') { context.set(key, value.cast<Arrayui16>()); }
-            else if(dtype == 'I') { context.set(key, value.cast<Arrayui32>()); }
-            else if(dtype == 'L') { context.set(key, value.cast<Arrayui64>()); }
+            else if(dtype == 'B') { SET_BUFFER(uint8_t); }
+            else if(dtype == 'H') { SET_BUFFER(uint16_t); }
+            else if(dtype == 'I') { SET_BUFFER(uint32_t); }
+            else if(dtype == 'L') { SET_BUFFER(uint64_t); }
             // Floating-point types
-            else if(dtype == 'f') { context.set(key, value.cast<Arrayf>()); }
-            else if(dtype == 'd') { context.set(key, value.cast<Arrayd>()); }
+            else if(dtype == 'f') { SET_BUFFER(float); }
+            else if(dtype == 'd') { SET_BUFFER(double); }
             // Unsupported type
             else
             {
                 throw std::runtime_error(
                     std::string("Array type not handled: ")+ dtype);
             }
+#undef SET_BUFFER
+            
+            // NOTE: log here, with the GIL held, since the context may be
+            // read by Stan models created in worker threads
+            if(!context.is_column_major(key))
+            {
+                Logger().debug(
+                    "Transposing "+key+" ("+std::to_string(array->size())
+                    +" elements) to column-major order");
+            }
         }
     }
     
     return context;
 }
 
+WarmStart to_warm_start(pybind11::dict data)
+{
+    WarmStart warm_start;
+    warm_start.stepsize = data["stepsize"].cast<Tensor1d>();
+    warm_start.inv_metric = data["inv_metric"].cast<Tensor2d>();
+    warm_start.init = data["init"].cast<Tensor2d>();
+    
+    return warm_start;
+}
+
 }
@@ -2,17 +2,20 @@
 #define _9ef486bc_b1a6_4872_b2a2_52eb0aea794c
 
 #include <functional>
+#include <vector>
 
 // WARNING: Stan must be included before Eigen so that the plugin system is
 // active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
 #include <stan/math.hpp>
 
 #include <pybind11/pybind11.h>
+#include <xtensor-python/pytensor.hpp>
 
 #include "slimp/api.h"
 #include "slimp/action_parameters.h"
 #include "slimp/misc.h"
 #include "slimp/VarContext.h"
+#include "slimp/WarmStart.h"
 
 namespace slimp
 {
@@ -21,14 +24,71 @@ namespace slimp
  * @brief Sample from a model.
  * @param data Dictionary of data passed to the sampler
  * @param parameters Sampling parameters
+ * @param warm_start None, or dictionary containing the step size ("stepsize"),
+ *        the diagonal of the inverse metric ("inv_metric") and the initial
+ *        values of the model parameters ("init") of each chain
+ * @param storage None, or a callable which is passed the shape of the samples
+ *        array (parameters × chains × draws) and returns a writable,
+ *        C-contiguous array of doubles with that shape, e.g. a memory-mapped
+ *        file, to which the samples are directly written
  * @return A dictionary containing the array of samples ("array"), the names of
- *         columns in the array ("columns") and the name of the model parameters
+ *         columns in the array ("columns"), the name of the model parameters
  *         (excluding transformed parameters and derived quantities,
- *         "parameters_columns")
+ *         "parameters_columns") and the inverse metric of each chain
+ *         ("inv_metric"): its diagonal for the diag_e and unit_e metrics, the
+ *         full matrix for the dense_e metric
  */
 template<typename Model>
 pybind11::dict SLIMP_API sample(
-    pybind11::dict data, action_parameters::Sample const & parameters);
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    pybind11::object warm_start=pybind11::none(),
+    pybind11::object storage=pybind11::none());
+
+/**
+ * @brief Find the posterior mode of a model with L-BFGS.
+ * @param data Dictionary of data passed to the model
+ * @param parameters Sampling parameters (seed, chain id, initialization)
+ * @param jacobian Whether to include the Jacobian of the constraining
+ *        transforms, i.e. find the mode in unconstrained space
+ * @param iterations Maximum number of L-BFGS iterations
+ * @return A dictionary with the same keys as sample, with a single chain and
+ *         a single draw, and without inverse metric
+ */
+template<typename Model>
+pybind11::dict SLIMP_API optimize(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    bool jacobian, int iterations);
+
+/**
+ * @brief Draw from the normal approximation of the posterior of a model at its
+ * mode in unconstrained space.
+ * @param data Dictionary of data passed to the model
+ * @param parameters Sampling parameters (seed, chain id, initialization)
+ * @param draws Number of draws
+ * @param iterations Maximum number of L-BFGS iterations to find the mode
+ * @return A dictionary with the same keys as sample, with a single chain, and
+ *         without inverse metric
+ */
+template<typename Model>
+pybind11::dict SLIMP_API laplace(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    std::size_t draws, int iterations);
+
+/**
+ * @brief Draw from the multi-path Pathfinder approximation of the posterior
+ * of a model.
+ * @param data Dictionary of data passed to the model
+ * @param parameters Sampling parameters (seed, chain id, initialization)
+ * @param paths Number of single Pathfinder runs
+ * @param draws Number of draws after importance resampling
+ * @param iterations Maximum number of L-BFGS iterations of each path
+ * @return A dictionary with the same keys as sample, with a single chain, and
+ *         without inverse metric
+ */
+template<typename Model>
+pybind11::dict SLIMP_API pathfinder(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    std::size_t paths, std::size_t draws, int iterations);
 
 /**
  * @brief Generate quantities from a model.
@@ -43,6 +103,40 @@ pybind11::dict SLIMP_API generate_quantities(
     pybind11::dict data, Tensor3d const & draws,
     action_parameters::Sample const & parameters);
 
+/**
+ * @brief Generate quantities from a model, only keeping their summary. The
+ * memory does not depend on the number of draws.
+ * @param data Dictionary of data
+ * @param draws Array of draws from sampling
+ * @param parameters Generation parameters
+ * @param probabilities Probabilities of the estimated quantiles
+ * @return A dictionary containing the names of the generated quantities
+ *         ("columns"), their mean ("mean"), standard deviation ("sd") and
+ *         quantiles ("quantiles", shape quantities × probabilities)
+ */
+template<typename Model>
+pybind11::dict SLIMP_API generate_quantities_summary(
+    pybind11::dict data, Tensor3d const & draws,
+    action_parameters::Sample const & parameters,
+    std::vector<double> const & probabilities);
+
+/**
+ * @brief Sample a model for many values of some of its data, in parallel. The
+ * shared context is built once, and only the per-task data is updated.
+ * @param data Dictionary of data shared by all tasks
+ * @param tasks_data Dictionary of per-task data, the first dimension of each
+ *        array being the task
+ * @param parameters Sampling parameters
+ * @return A dictionary containing the array of samples of shape
+ *         tasks × parameters × chains × draws ("array"), the names of
+ *         parameters in the array ("columns") and the name of the model
+ *         parameters ("parameters_columns")
+ */
+template<typename Model>
+pybind11::dict SLIMP_API batch_sample(
+    pybind11::dict data, pybind11::dict tasks_data,
+    action_parameters::Sample const & parameters);
+
 using ResultsUpdater = std::function<void(Tensor3d const &, std::size_t)>;
 
 /// @brief Sample different contexts from a same model in parallel.
@@ -91,7 +185,49 @@ Tensor1d SLIMP_API get_split_potential_scale_reduction(Tensor3d const & draws);
  */
 Tensor2d SLIMP_API get_split_potential_scale_reduction(Tensor4d const & data);
 
+/**
+ * @brief Compute the summary statistics of each parameter, in a single pass
+ * over its draws and in parallel over the parameters.
+ * @param draws Array of draws, of shape parameters × chains × draws
+ * @param probabilities Probabilities of the quantiles
+ * @return Array of shape parameters × (4+probabilities), containing for each
+ *         parameter its mean, standard deviation, quantiles, effective sample
+ *         size and split-chain potential scale reduction
+ */
+Tensor2d SLIMP_API summary(
+    Tensor3d const & draws, std::vector<double> const & probabilities);
+
+/**
+ * @brief Compute the rank-normalized split-chain potential scale reduction
+ * (Rhat) and the bulk and tail effective sample sizes of each parameter
+ * (Vehtari et al., Rank-Normalization, Folding, and Localization: An Improved
+ * R̂ for Assessing Convergence of MCMC, 2021), in parallel over the parameters.
+ * @param draws Array of draws, of shape parameters × chains × draws. The
+ *        array may be non-contiguous, it is not copied.
+ * @return Array of shape parameters × 3, containing for each parameter its
+ *         Rhat, bulk effective sample size and tail effective sample size
+ */
+Tensor2d SLIMP_API get_rank_normalized_diagnostics(
+    xt::pytensor<double, 3> const & draws);
+
+/**
+ * @brief Compute the pointwise Pareto-smoothed importance sampling leave-one-out
+ * (PSIS-LOO, Vehtari et al., Practical Bayesian model evaluation using
+ * leave-one-out cross-validation and WAIC, 2017) and WAIC criteria, in
+ * parallel over the observations.
+ * @param log_likelihood Array of pointwise log-likelihood, of shape
+ *        observations × chains × draws
+ * @return Array of shape observations × 5, containing for each observation its
+ *         expected log pointwise predictive density (ELPD) and effective
+ *         number of parameters for LOO, the Pareto shape parameter of the
+ *         smoothed importance weights, and the ELPD and effective number of
+ *         parameters for WAIC
+ */
+Tensor2d SLIMP_API get_pointwise_loo_waic(Tensor3d const & log_likelihood);
+
 VarContext SLIMP_API to_context(pybind11::dict data);
+
+WarmStart SLIMP_API to_warm_start(pybind11::dict data);
 }
 
 #include "actions.txx"
@@ -3,6 +3,8 @@
 
 #include "actions.h"
 
+#include <algorithm>
+#include <stdexcept>
 #include <string>
 #include <vector>
 
@@ -13,10 +15,21 @@
 // active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
 #include <stan/math.hpp>
 
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+#if __has_include(<xtensor/xtensor.hpp>)
+#include <xtensor/xview.hpp>
+#else
+#include <xtensor/views/xview.hpp>
+#endif
+#include <xtensor-python/pyarray.hpp>
+#include <xtensor-python/pytensor.hpp>
 
 #include "slimp/action_parameters.h"
+#include "slimp/ArrayWriter.h"
+#include "slimp/misc.h"
 #include "slimp/Model.h"
+#include "slimp/SummaryWriter.h"
 #include "slimp/VarContext.h"
 
 namespace slimp
@@ -24,7 +37,8 @@ namespace slimp
 
 template<typename T>
 pybind11::dict sample(
-    pybind11::dict data, action_parameters::Sample const & parameters)
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    pybind11::object warm_start, pybind11::object storage)
 {
     auto const g = tbb::global_control(
         tbb::global_control::max_allowed_parallelism, 
@@ -34,8 +48,45 @@ pybind11::dict sample(
     
     auto context = to_context(data);
     Model<T> model(context, parameters);
-    auto samples = model.create_samples();
-    model.sample(samples);
+    
+    // Samples are either stored in memory or in the buffer of the storage
+    Tensor3d memory;
+    pybind11::object samples;
+    auto view = [&]() {
+        if(storage.is_none())
+        {
+            memory = model.create_samples();
+            return ArrayWriter::view(memory);
+        }
+        
+        auto const shape = model.samples_shape();
+        samples = storage(pybind11::make_tuple(shape[0], shape[1], shape[2]));
+        auto array = samples.cast<pybind11::array>();
+        if(
+            !array.dtype().is(pybind11::dtype::of<double>())
+            || !(array.flags() & pybind11::array::c_style)
+            || !array.writeable() || array.ndim() != 3
+            || !std::equal(
+                shape.begin(), shape.end(), array.shape(),
+                [](std::size_t x, pybind11::ssize_t y) {
+                    return x == static_cast<std::size_t>(y); }))
+        {
+            throw std::runtime_error(
+                "Storage must be a writable, C-contiguous array of doubles "
+                "of shape parameters × chains × draws");
+        }
+        return ArrayWriter::view(
+            static_cast<double *>(array.mutable_data()), shape);
+    }();
+    
+    if(warm_start.is_none())
+    {
+        model.sample(view);
+    }
+    else
+    {
+        model.sample(view, to_warm_start(warm_start.cast<pybind11::dict>()));
+    }
     
     std::vector<std::string> names = model.hmc_names();
     auto const model_names = model.model_names();
@@ -44,13 +95,74 @@ pybind11::dict sample(
     auto const parameters_names = model.model_names(false, false);
     
     pybind11::dict result;
-    result["array"] = samples;
+    if(storage.is_none())
+    {
+        result["array"] = std::move(memory);
+    }
+    else
+    {
+        result["array"] = samples;
+    }
     result["columns"] = names;
     result["parameters_columns"] = parameters_names;
+    result["inv_metric"] = model.inv_metric();
+    
+    return result;
+}
+
+/// @brief Result of an approximate inference, see optimize
+template<typename T>
+pybind11::dict approximation_result(
+    Model<T> const & model, typename Model<T>::Array && array,
+    std::vector<std::string> names)
+{
+    auto const model_names = model.model_names();
+    std::copy(model_names.begin(), model_names.end(), std::back_inserter(names));
+    
+    pybind11::dict result;
+    result["array"] = std::move(array);
+    result["columns"] = names;
+    result["parameters_columns"] = model.model_names(false, false);
     
     return result;
 }
 
+template<typename T>
+pybind11::dict optimize(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    bool jacobian, int iterations)
+{
+    auto context = to_context(data);
+    Model<T> model(context, parameters);
+    return approximation_result(
+        model, model.optimize(jacobian, iterations), {"lp__"});
+}
+
+template<typename T>
+pybind11::dict laplace(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    std::size_t draws, int iterations)
+{
+    auto context = to_context(data);
+    Model<T> model(context, parameters);
+    auto const mode = model.optimize(true, iterations);
+    // NOTE: log_p__ is the unnormalized log density, i.e. lp__
+    return approximation_result(
+        model, model.laplace(mode, draws), {"lp__", "log_g__"});
+}
+
+template<typename T>
+pybind11::dict pathfinder(
+    pybind11::dict data, action_parameters::Sample const & parameters,
+    std::size_t paths, std::size_t draws, int iterations)
+{
+    auto context = to_context(data);
+    Model<T> model(context, parameters);
+    return approximation_result(
+        model, model.pathfinder(paths, draws, iterations),
+        {"lp_approx__", "lp__"});
+}
+
 template<typename T>
 pybind11::dict generate_quantities(
     pybind11::dict data, xt::xtensor<double, 3> const & draws,
@@ -73,6 +185,96 @@ pybind11::dict generate_quantities(
     return result;
 }
 
+template<typename T>
+pybind11::dict generate_quantities_summary(
+    pybind11::dict data, xt::xtensor<double, 3> const & draws,
+    action_parameters::Sample const & parameters,
+    std::vector<double> const & probabilities)
+{
+    auto context = to_context(data);
+    Model<T> model(context, parameters);
+    SummaryWriter writer(probabilities);
+    model.generate(draws, writer);
+    
+    pybind11::dict result;
+    result["columns"] = writer.names();
+    result["mean"] = writer.mean();
+    result["sd"] = writer.sd();
+    result["quantiles"] = writer.quantiles();
+    
+    return result;
+}
+
+template<typename T>
+pybind11::dict batch_sample(
+    pybind11::dict data, pybind11::dict tasks_data,
+    action_parameters::Sample const & parameters)
+{
+    auto context = to_context(data);
+    
+    std::vector<std::pair<std::string, Arrayd>> tasks_values;
+    for(auto && item: tasks_data)
+    {
+        tasks_values.emplace_back(
+            item.first.cast<std::string>(), item.second.cast<Arrayd>());
+    }
+    if(tasks_values.empty())
+    {
+        throw std::runtime_error("No per-task data");
+    }
+    auto const tasks_count = tasks_values[0].second.shape(0);
+    for(auto && [name, values]: tasks_values)
+    {
+        if(values.shape(0) != tasks_count)
+        {
+            throw std::runtime_error("Mismatched number of tasks in "+name);
+        }
+    }
+    
+    // NOTE: the shape of the samples does not depend on the per-task data
+    Model<T> model(context, parameters);
+    auto const shape = model.create_samples().shape();
+    
+    auto array = xt::pytensor<double, 4>::from_shape(
+        {tasks_count, shape[0], shape[1], shape[2]});
+    
+    {
+        pybind11::gil_scoped_release release_gil;
+        
+        parallel_sample<Model<T>>(
+            context, parameters, tasks_count,
+            std::function<void(VarContext &, std::size_t)>(
+                [&](VarContext & task_context, std::size_t task) {
+                    for(auto && [name, values]: tasks_values)
+                    {
+                        if(values.dimension() == 1)
+                        {
+                            task_context.set(name, values(task));
+                        }
+                        else
+                        {
+                            task_context.set(
+                                name, Arrayd(xt::view(values, task)));
+                        }
+                    }
+                }),
+            [&](Tensor3d const & samples, std::size_t task) {
+                xt::view(array, task) = samples;
+            });
+    }
+    
+    std::vector<std::string> names = model.hmc_names();
+    auto const model_names = model.model_names();
+    std::copy(model_names.begin(), model_names.end(), std::back_inserter(names));
+    
+    pybind11::dict result;
+    result["array"] = array;
+    result["columns"] = names;
+    result["parameters_columns"] = model.model_names(false, false);
+    
+    return result;
+}
+
 template<typename Model>
 void parallel_sample(
     slimp::VarContext const & context,
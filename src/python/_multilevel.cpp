@@ -0,0 +1,37 @@
+// WARNING: Stan must be included before Eigen so that the plugin system is
+// active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+#include <stan/math.hpp>
+
+#include <pybind11/eigen.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#define FORCE_IMPORT_ARRAY
+#include <xtensor-python/pyarray.hpp>
+#include <xtensor-python/pytensor.hpp>
+
+#include "register.h"
+
+#include "multilevel/log_likelihood.h"
+#include "multilevel/parallel_sampler.h"
+#include "multilevel/predict_posterior.h"
+#include "multilevel/predict_prior.h"
+#include "multilevel/sampler.h"
+#include "multilevel/segment_sampler.h"
+
+PYBIND11_MODULE(_multilevel, module)
+{
+    xt::import_numpy();
+    
+    // NOTE: the action parameters are registered by the core module
+    pybind11::module_::import("slimp._slimp");
+    
+    REGISTER_SAMPLER(multilevel);
+    REGISTER_PARALLEL_SAMPLER(multilevel);
+    REGISTER_SEGMENT_SAMPLER(multilevel);
+    REGISTER_BATCH_SAMPLER(multilevel);
+    REGISTER_APPROXIMATIONS(multilevel);
+    REGISTER_GQ(multilevel, log_likelihood);
+    REGISTER_GQ(multilevel, predict_posterior);
+    REGISTER_GQ_SUMMARY(multilevel, predict_posterior);
+    REGISTER_GQ(multilevel, predict_prior);
+}
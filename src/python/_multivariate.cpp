@@ -0,0 +1,29 @@
+// WARNING: Stan must be included before Eigen so that the plugin system is
+// active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+#include <stan/math.hpp>
+
+#include <pybind11/eigen.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#define FORCE_IMPORT_ARRAY
+#include <xtensor-python/pyarray.hpp>
+#include <xtensor-python/pytensor.hpp>
+
+#include "register.h"
+
+#include "multivariate/log_likelihood.h"
+#include "multivariate/parallel_sampler.h"
+#include "multivariate/predict_posterior.h"
+#include "multivariate/predict_prior.h"
+#include "multivariate/sampler.h"
+#include "multivariate/sufficient_sampler.h"
+
+PYBIND11_MODULE(_multivariate, module)
+{
+    xt::import_numpy();
+    
+    // NOTE: the action parameters are registered by the core module
+    pybind11::module_::import("slimp._slimp");
+    
+    REGISTER_ALL(multivariate);
+}
@@ -12,34 +12,6 @@
 #include "slimp/action_parameters.h"
 #include "slimp/actions.h"
 
-#include "multilevel/predict_prior.h"
-#include "multilevel/predict_posterior.h"
-#include "multilevel/sampler.h"
-
-#include "multivariate/log_likelihood.h"
-#include "multivariate/predict_posterior.h"
-#include "multivariate/predict_prior.h"
-#include "multivariate/sampler.h"
-
-#include "univariate/log_likelihood.h"
-#include "univariate/predict_posterior.h"
-#include "univariate/predict_prior.h"
-#include "univariate/sampler.h"
-
-#define REGISTER_SAMPLER(name) \
-    module.def(\
-        #name "_sampler", \
-        &slimp::sample<name##_sampler::model>);
-#define REGISTER_GQ(name, quantity) \
-    module.def( \
-        #name "_" #quantity, \
-        &slimp::generate_quantities<name##_##quantity::model>);
-#define REGISTER_ALL(name) \
-    REGISTER_SAMPLER(name) \
-    REGISTER_GQ(name, log_likelihood); \
-    REGISTER_GQ(name, predict_posterior); \
-    REGISTER_GQ(name, predict_prior);
-
 #define SET_FROM_KWARGS(kwargs, name, object, type) \
     if(kwargs.contains(#name)) { object.name = kwargs[#name].cast<type>(); }
 
@@ -166,6 +138,7 @@ PYBIND11_MODULE(_slimp, module)
                 SET_FROM_KWARGS(kwargs, id, x, int)
                 SET_FROM_KWARGS(kwargs, init_radius, x, double)
                 SET_FROM_KWARGS(kwargs, refresh, x, int)
+                SET_FROM_KWARGS(kwargs, metric, x, std::string)
                 SET_FROM_KWARGS(kwargs, sequential_chains, x, bool)
                 SET_FROM_KWARGS(kwargs, threads_per_chain, x, unsigned int)
                 return x;}))
@@ -186,6 +159,7 @@ PYBIND11_MODULE(_slimp, module)
             "init_radius", &slimp::action_parameters::Sample::init_radius)
         .def_readwrite(
             "refresh", &slimp::action_parameters::Sample::refresh)
+        .def_readwrite("metric", &slimp::action_parameters::Sample::metric)
         .def_readwrite(
             "sequential_chains",
             &slimp::action_parameters::Sample::sequential_chains)
@@ -207,6 +181,7 @@ PYBIND11_MODULE(_slimp, module)
                 state["id"] = self.id;
                 state["init_radius"] = self.init_radius;
                 state["refresh"] = self.refresh;
+                state["metric"] = self.metric;
                 state["sequential_chains"] = self.sequential_chains;
                 state["threads_per_chain"] = self.threads_per_chain;
                 
@@ -226,6 +201,11 @@ PYBIND11_MODULE(_slimp, module)
                 self.id = state["id"].cast<int>();
                 self.init_radius = state["init_radius"].cast<double>();
                 self.refresh = state["refresh"].cast<int>();
+                // NOTE: states pickled before the metric option use diag_e
+                if(state.contains("metric"))
+                {
+                    self.metric = state["metric"].cast<std::string>();
+                }
                 self.sequential_chains =
                     state["sequential_chains"].cast<bool>();
                 self.threads_per_chain =
@@ -234,12 +214,6 @@ PYBIND11_MODULE(_slimp, module)
                 return self;
             }));
     
-    REGISTER_ALL(univariate);
-    REGISTER_ALL(multivariate);
-    REGISTER_SAMPLER(multilevel);
-    REGISTER_GQ(multilevel, predict_posterior);
-    REGISTER_GQ(multilevel, predict_prior);
-    
     module.def(
         "get_effective_sample_size",
         pybind11::overload_cast<xt::xtensor<double, 3> const &>(
@@ -264,4 +238,16 @@ PYBIND11_MODULE(_slimp, module)
         "get_split_potential_scale_reduction",
         pybind11::overload_cast<xt::xtensor<double, 4> const &>(
             &slimp::get_split_potential_scale_reduction));
+    module.def(
+        "get_rank_normalized_diagnostics",
+        &slimp::get_rank_normalized_diagnostics, pybind11::arg("draws"),
+        pybind11::call_guard<pybind11::gil_scoped_release>());
+    module.def(
+        "get_pointwise_loo_waic", &slimp::get_pointwise_loo_waic,
+        pybind11::arg("log_likelihood"),
+        pybind11::call_guard<pybind11::gil_scoped_release>());
+    module.def(
+        "summary", &slimp::summary,
+        pybind11::arg("draws"), pybind11::arg("probabilities"),
+        pybind11::call_guard<pybind11::gil_scoped_release>());
 }
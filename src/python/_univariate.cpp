@@ -0,0 +1,29 @@
+// WARNING: Stan must be included before Eigen so that the plugin system is
+// active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+#include <stan/math.hpp>
+
+#include <pybind11/eigen.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+#define FORCE_IMPORT_ARRAY
+#include <xtensor-python/pyarray.hpp>
+#include <xtensor-python/pytensor.hpp>
+
+#include "register.h"
+
+#include "univariate/log_likelihood.h"
+#include "univariate/parallel_sampler.h"
+#include "univariate/predict_posterior.h"
+#include "univariate/predict_prior.h"
+#include "univariate/sampler.h"
+#include "univariate/sufficient_sampler.h"
+
+PYBIND11_MODULE(_univariate, module)
+{
+    xt::import_numpy();
+    
+    // NOTE: the action parameters are registered by the core module
+    pybind11::module_::import("slimp._slimp");
+    
+    REGISTER_ALL(univariate);
+}
@@ -0,0 +1,76 @@
+#ifndef _5b0e7c2d_8f41_4a96_b3e5_2d9c71a4f086
+#define _5b0e7c2d_8f41_4a96_b3e5_2d9c71a4f086
+
+// Registration of the actions of a model family, used by the extension module
+// of each family. The action parameters are registered by the _slimp module.
+
+#include <pybind11/pybind11.h>
+
+#include "slimp/actions.h"
+
+#define REGISTER_SAMPLER(name) \
+    module.def(\
+        #name "_sampler", \
+        &slimp::sample<name##_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("warm_start")=pybind11::none(), \
+        pybind11::arg("storage")=pybind11::none());
+#define REGISTER_PARALLEL_SAMPLER(name) \
+    module.def(\
+        #name "_parallel_sampler", \
+        &slimp::sample<name##_parallel_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("warm_start")=pybind11::none(), \
+        pybind11::arg("storage")=pybind11::none());
+#define REGISTER_SUFFICIENT_SAMPLER(name) \
+    module.def(\
+        #name "_sufficient_sampler", \
+        &slimp::sample<name##_sufficient_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("warm_start")=pybind11::none(), \
+        pybind11::arg("storage")=pybind11::none());
+#define REGISTER_SEGMENT_SAMPLER(name) \
+    module.def(\
+        #name "_segment_sampler", \
+        &slimp::sample<name##_segment_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("warm_start")=pybind11::none(), \
+        pybind11::arg("storage")=pybind11::none());
+#define REGISTER_BATCH_SAMPLER(name) \
+    module.def(\
+        #name "_batch_sampler", \
+        &slimp::batch_sample<name##_sampler::model>);
+#define REGISTER_APPROXIMATIONS(name) \
+    module.def(\
+        #name "_optimize", &slimp::optimize<name##_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("jacobian")=false, pybind11::arg("iterations")=2000); \
+    module.def(\
+        #name "_laplace", &slimp::laplace<name##_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("draws")=1000, pybind11::arg("iterations")=2000); \
+    module.def(\
+        #name "_pathfinder", &slimp::pathfinder<name##_sampler::model>, \
+        pybind11::arg("data"), pybind11::arg("parameters"), \
+        pybind11::arg("paths")=4, pybind11::arg("draws")=1000, \
+        pybind11::arg("iterations")=1000);
+#define REGISTER_GQ(name, quantity) \
+    module.def( \
+        #name "_" #quantity, \
+        &slimp::generate_quantities<name##_##quantity::model>);
+#define REGISTER_GQ_SUMMARY(name, quantity) \
+    module.def( \
+        #name "_" #quantity "_summary", \
+        &slimp::generate_quantities_summary<name##_##quantity::model>);
+#define REGISTER_ALL(name) \
+    REGISTER_SAMPLER(name) \
+    REGISTER_PARALLEL_SAMPLER(name) \
+    REGISTER_SUFFICIENT_SAMPLER(name) \
+    REGISTER_BATCH_SAMPLER(name) \
+    REGISTER_APPROXIMATIONS(name) \
+    REGISTER_GQ(name, log_likelihood); \
+    REGISTER_GQ(name, predict_posterior); \
+    REGISTER_GQ_SUMMARY(name, predict_posterior); \
+    REGISTER_GQ(name, predict_prior);
+
+#endif // _5b0e7c2d_8f41_4a96_b3e5_2d9c71a4f086
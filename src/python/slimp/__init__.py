@@ -1,11 +1,43 @@
-from ._slimp import (
-    action_parameters, get_effective_sample_size, get_potential_scale_reduction,
-    get_split_potential_scale_reduction)
-from .misc import sample_data_as_df, sample_data_as_xarray
-from .model import Model
-from .plots import KDEPlot, parameters_plot, predictive_plot
-from .samples import Samples
-from .stats import hmc_diagnostics, r_squared, summary
-
-from . import multilevel, multivariate, univariate
-from .multivariate import NoCorrelation
+import importlib
+
+# NOTE: the sub-modules, and their dependencies (native extension, plotting
+# and arviz conversion), are imported on first use of the names they define,
+# so that importing slimp is fast.
+_attributes = {
+    **{
+        name: "._slimp" for name in [
+            "action_parameters", "get_effective_sample_size",
+            "get_potential_scale_reduction", "get_pointwise_loo_waic",
+            "get_rank_normalized_diagnostics",
+            "get_split_potential_scale_reduction"]},
+    "batch_sample": ".batch",
+    "sample_data_as_df": ".misc", "sample_data_as_xarray": ".misc",
+    "Model": ".model",
+    "KDEPlot": ".plots", "parameters_plot": ".plots",
+    "predictive_plot": ".plots",
+    "Predictor": ".predictor",
+    "Samples": ".samples",
+    "hmc_diagnostics": ".stats", "r_squared": ".stats", "summary": ".stats",
+    "NoCorrelation": ".multivariate"}
+
+_modules = [
+    "_multilevel", "_multivariate", "_slimp", "_univariate", "batch",
+    "compile", "misc", "model", "multilevel", "multivariate", "plots",
+    "predictor", "samples", "serialization", "stats", "univariate"]
+
+__all__ = list(_attributes)
+
+def __getattr__(name):
+    if name in _attributes:
+        value = getattr(
+            importlib.import_module(_attributes[name], __name__), name)
+    elif name in _modules:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted([*globals(), *_attributes, *_modules])
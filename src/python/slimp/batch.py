@@ -0,0 +1,53 @@
+import numpy
+import xarray
+
+from .model import Model
+
+def batch_sample(
+        formula, data, outcomes, seed=-1, num_chains=1,
+        sampler_parameters=None, **kwargs):
+    """ Sample the same model for many outcomes sharing the same predictors.
+        
+        The data is converted once, and only the outcomes (and the priors
+        depending on them) are updated for each task. Tasks run in parallel,
+        without the GIL.
+        
+        :param formula: formula of the model, as in Model
+        :param data: data frame of the predictors. The outcomes columns are
+            used only to build the model matrices and are filled with the first
+            task if missing
+        :param outcomes: array of outcomes of shape tasks × observations
+            (× outcomes for multivariate models)
+        :return: array of draws, of dimensions task × parameter × chain × sample
+    """
+    
+    outcomes = numpy.asarray(outcomes, float)
+    
+    lhs = [
+        x.split("~")[0].strip()
+        for x in (
+            [formula] if isinstance(formula, str)
+            else [formula[0]] if isinstance(formula[-1], tuple)
+            else formula)]
+    missing = {
+        name: outcomes[0, :, index] if outcomes.ndim == 3 else outcomes[0]
+        for index, name in enumerate(lhs) if name not in data.columns}
+    if missing:
+        data = data.assign(**missing)
+    
+    model = Model(
+        formula, data, seed, num_chains, sampler_parameters, **kwargs)
+    
+    sampler = model._native("batch_sampler")
+    result = sampler(
+        model.fit_data, model._model_data.batch_data(outcomes),
+        model.sampler_parameters)
+    
+    return xarray.DataArray(
+        result["array"],
+        dims=["task", "parameter", "chain", "sample"],
+        coords={
+            "task": range(result["array"].shape[0]),
+            "parameter": model._model_data.predictor_mapper(result["columns"]),
+            "chain": range(result["array"].shape[2]),
+            "sample": range(result["array"].shape[3])})
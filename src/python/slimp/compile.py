@@ -1,14 +1,60 @@
 import argparse
+import hashlib
+import importlib.util
 import os
 import re
 import shlex
 import subprocess
 import sys
+import sysconfig
 import tempfile
 import textwrap
 
-def compile(stan_file, h_file, include_path=None, prefix=None):
-    name = os.path.splitext(os.path.basename(stan_file))[0]
+# Extension module exposing the actions of a custom model, see build_model
+_WRAPPER = textwrap.dedent("""\
+    // WARNING: Stan must be included before Eigen so that the plugin system is
+    // active. https://discourse.mc-stan.org/t/includes-in-user-header/26093
+    #include <stan/math.hpp>
+    
+    #include <pybind11/eigen.h>
+    #include <pybind11/pybind11.h>
+    #include <pybind11/stl.h>
+    #define FORCE_IMPORT_ARRAY
+    #include <xtensor-python/pyarray.hpp>
+    #include <xtensor-python/pytensor.hpp>
+    
+    #include "slimp/actions.h"
+    
+    #include "model.h"
+    
+    PYBIND11_MODULE({module}, module)
+    {{
+        xt::import_numpy();
+        
+        // NOTE: the action parameters are registered by the core module
+        pybind11::module_::import("slimp._slimp");
+        
+        module.def(
+            "sample", &slimp::sample<{namespace}::model>,
+            pybind11::arg("data"), pybind11::arg("parameters"),
+            pybind11::arg("warm_start")=pybind11::none(),
+            pybind11::arg("storage")=pybind11::none());
+        module.def(
+            "generate_quantities",
+            &slimp::generate_quantities<{namespace}::model>);
+        module.def(
+            "generate_quantities_summary",
+            &slimp::generate_quantities_summary<{namespace}::model>);
+    }}
+""")
+
+def compile(stan_file, h_file, include_path=None, prefix=None, name=None):
+    """ Compile a Stan file to a C++ header, in a namespace named after the
+        Stan file, or after name if given.
+    """
+    
+    if name is None:
+        name = os.path.splitext(os.path.basename(stan_file))[0]
     if prefix:
         name = f"{prefix}{name}"
     
@@ -67,6 +113,131 @@ def stan_info(names, optimize=True, use_threads=True, range_checks=False):
             "make", "-I", os.environ["CMDSTAN"], "-f", path, *names])
     return shlex.split(flags.decode())
 
+def build_model(
+        stan_file, include_path=None, cache_dir=None, cxxflags=None,
+        ldflags=None):
+    """ Compile a Stan model to an extension module exposing its sample,
+        generate_quantities and generate_quantities_summary actions, and
+        import it.
+        
+        Compiled modules are cached in cache_dir under a digest of the Stan
+        source, of the Stan files of the include path, of the compilation flags
+        and of the slimp extension, so that an unchanged model is imported
+        without compilation. With GCC, Stan math is compiled once to a
+        precompiled header, shared by all models built with the same flags.
+        
+        :param stan_file: path to the Stan source
+        :param include_path: optional directory of included Stan files
+        :param cache_dir: cache directory, defaults to the SLIMP_CACHE
+            environment variable or to ~/.cache/slimp
+        :param cxxflags: additional compilation flags, e.g. the location of
+            the slimp headers, defaults to the CXXFLAGS environment variable
+        :param ldflags: additional link flags, e.g. the location of the slimp
+            library, defaults to the LDFLAGS environment variable
+        :return: the extension module
+    """
+    
+    if cache_dir is None:
+        cache_dir = os.environ.get(
+            "SLIMP_CACHE",
+            os.path.join(os.path.expanduser("~"), ".cache", "slimp"))
+    if cxxflags is None:
+        cxxflags = shlex.split(os.environ.get("CXXFLAGS", ""))
+    if ldflags is None:
+        ldflags = shlex.split(os.environ.get("LDFLAGS", ""))
+    cxx = os.environ.get("CXX", "c++")
+    
+    compile_flags = [
+        *stan_info("cxxflags"), "-DTBB_INTERFACE_NEW", "-fPIC",
+        *[f"-I{x}" for x in _extension_include_paths()], *cxxflags]
+    link_flags = [*stan_info(["ldflags", "libs"]), *ldflags, "-lslimp"]
+    
+    digest = hashlib.sha256()
+    stan_files = [stan_file]
+    if include_path:
+        stan_files.extend(
+            os.path.join(directory, name)
+            for directory, _, names in sorted(os.walk(include_path))
+            for name in sorted(names) if name.endswith(".stan"))
+    for path in stan_files:
+        with open(path, "rb") as fd:
+            digest.update(fd.read())
+    core = os.stat(importlib.util.find_spec("slimp._slimp").origin)
+    digest.update(
+        shlex.join([
+            _WRAPPER, cxx, *compile_flags, *link_flags,
+            str(core.st_size), str(core.st_mtime_ns),
+            sysconfig.get_config_var("EXT_SUFFIX")]).encode())
+    digest = digest.hexdigest()
+    
+    # NOTE: the module and the generated namespace share the same name, which
+    # must be a valid identifier in both Python and C++
+    name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(stan_file))[0])
+    module = f"_{name}_{digest[:16]}"
+    path = os.path.join(
+        cache_dir, digest, f"{module}{sysconfig.get_config_var('EXT_SUFFIX')}")
+    
+    if not os.path.isfile(path):
+        header = _precompiled_header(cache_dir, cxx, compile_flags)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+            compile(
+                stan_file, os.path.join(build_dir, "model.h"), include_path,
+                name=module)
+            with open(os.path.join(build_dir, "module.cpp"), "w") as fd:
+                fd.write(_WRAPPER.format(module=module, namespace=module))
+            subprocess.check_call([
+                cxx, "-shared", *compile_flags,
+                *(["-include", header] if header else []),
+                "-I", build_dir, os.path.join(build_dir, "module.cpp"),
+                "-o", os.path.join(build_dir, "module.so"), *link_flags])
+            # NOTE: concurrent builds of the same model are harmless
+            os.replace(os.path.join(build_dir, "module.so"), path)
+    
+    if module not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module, path)
+        sys.modules[module] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[module])
+    return sys.modules[module]
+
+def _extension_include_paths():
+    """ Include paths of Python, NumPy and pybind11 """
+    
+    import numpy
+    paths = [sysconfig.get_paths()["include"], numpy.get_include()]
+    try:
+        import pybind11
+    except ImportError:
+        # NOTE: pybind11 may be installed as a system library
+        pass
+    else:
+        paths.append(pybind11.get_include())
+    return paths
+
+def _precompiled_header(cache_dir, cxx, flags):
+    """ Path of a header including Stan math, which is precompiled with the
+        given flags on first use, or None if the compiler is not GCC, whose
+        lookup of .gch files this relies on.
+    """
+    
+    macros = subprocess.check_output(
+        [cxx, "-dM", "-E", "-x", "c++", os.devnull], text=True)
+    if "__GNUC__" not in macros or "__clang__" in macros:
+        return None
+    
+    digest = hashlib.sha256(shlex.join([cxx, *flags]).encode()).hexdigest()
+    directory = os.path.join(cache_dir, "pch", digest)
+    header = os.path.join(directory, "stan_math.hpp")
+    if not os.path.isfile(f"{header}.gch"):
+        os.makedirs(directory, exist_ok=True)
+        with open(header, "w") as fd:
+            fd.write("#include <stan/math.hpp>\n")
+        subprocess.check_call([
+            cxx, *flags, "-x", "c++-header", header,
+            "-o", f"{header}.gch.{os.getpid()}"])
+        os.replace(f"{header}.gch.{os.getpid()}", f"{header}.gch")
+    return header
+
 def main():
     try:
         command = sys.argv[1]
@@ -90,6 +261,13 @@ def main():
         parser.add_argument("--range-checks", dest="use_threads", action="store_true")
         arguments = parser.parse_args(sys.argv[2:])
         print(shlex.join(stan_info(**vars(arguments))))
+    elif command == "build":
+        parser = argparse.ArgumentParser()
+        parser.add_argument("stan_file")
+        parser.add_argument("--include-path", "-I")
+        parser.add_argument("--cache-dir")
+        arguments = parser.parse_args(sys.argv[2:])
+        print(build_model(**vars(arguments)).__file__)
     else:
         print(f"Unknown command: {command}")
         return 1
@@ -1,4 +1,8 @@
-import arviz
+import glob
+import hashlib
+import os
+
+import numpy
 import pandas
 import xarray
 
@@ -19,6 +23,9 @@ def sample_data_as_xarray(data):
 def to_arviz(model):
     """Convert the slimp mode to arviz inference data"""
     
+    # NOTE: arviz is slow to import, only do it when needed
+    import arviz
+    
     # Helper to rename slimp dimensions to arviz dimensions
     def rename(x, observations=False):
         x = x.rename({
@@ -32,7 +39,8 @@ def to_arviz(model):
         return model._generate_quantities(name, converter=sample_data_as_xarray)
     
     log_likelihood = xarray.Dataset({
-        model.outcomes.columns[0]: rename(generate("log_likelihood"), True)})
+        model.outcomes.columns[0]: rename(
+            model._generate_log_likelihood(sample_data_as_xarray), True)})
     
     # Split samples in sampling statistics and posterior
     samples = rename(model._samples.samples).to_dataset("parameter")
@@ -43,7 +51,7 @@ def to_arviz(model):
             "stepsize__": "step_size", "treedepth__": "tree_depth",
             "n_leapfrog__": "n_steps", "divergent__": "diverging",
             "energy__": "energy"}))
-    posterior = samples[[x for x in samples if not x.endswith("__")]]
+    posterior = samples[model._samples.parameters]
     
     # Get prior-predictive data, split it in y, mu variables in a dataset
     data = generate("predict_prior")
@@ -67,3 +75,122 @@ def to_arviz(model):
         observed_data = xarray.Dataset(model.outcomes))
     
     return ds
+
+def comoments(arrays, chunk_size=2**16):
+    """ Mean and co-moment matrix, Σ (v-v̄)(v-v̄)ᵀ, of the rows of the
+        horizontal concatenation of 2D arrays. The rows are processed in chunks
+        whose partial moments are merged (Chan, Golub & LeVeque, 1979), so that
+        the full concatenated array is never created.
+    """
+    
+    arrays = [numpy.asarray(x, float).reshape(len(x), -1) for x in arrays]
+    size = sum(x.shape[1] for x in arrays)
+    
+    count, mean, C = 0, numpy.zeros(size), numpy.zeros((size, size))
+    for begin in range(0, len(arrays[0]), chunk_size):
+        chunk = numpy.hstack([x[begin:begin+chunk_size] for x in arrays])
+        
+        chunk_mean = chunk.mean(axis=0)
+        chunk -= chunk_mean
+        delta = chunk_mean - mean
+        total = count + len(chunk)
+        
+        C += chunk.T @ chunk + numpy.outer(delta, delta) * count*len(chunk)/total
+        mean += delta * len(chunk)/total
+        count = total
+    
+    return mean, C
+
+def cast_like(data, reference):
+    """ Cast the columns of a data frame to the types of the same columns in
+        a reference data frame. Columns which already have the right type are
+        not copied, and the data frame is returned as-is if no cast is needed.
+    """
+    
+    dtypes = {
+        k: v for k, v in reference.dtypes.items()
+        if k in data.columns and data[k].dtype != v}
+    return data.astype(dtypes) if dtypes else data
+
+def digest(data):
+    """ SHA-256 digest of a dictionary of scalars and arrays, e.g. the data
+        passed to a sampler: the names, types, shapes and values of its items
+        are hashed, in name order.
+    """
+    
+    sha256 = hashlib.sha256()
+    for key in sorted(data):
+        value = numpy.ascontiguousarray(data[key])
+        sha256.update(f"{key}:{value.dtype.str}:{value.shape}".encode())
+        sha256.update(value.tobytes())
+    return sha256.hexdigest()
+
+def write_checkpoint(directory, data, metadata):
+    """ Write a block of draws, and the state of the sampler at its end, to a
+        checkpoint directory. Each block is written to a temporary file which
+        is then atomically renamed, so that an interruption never leaves a
+        partial block.
+        
+        :param directory: checkpoint directory, created if needed
+        :param data: output of a sampler, for the new draws only
+        :param metadata: dictionary of scalars or strings identifying the run
+            (e.g. formula, number of chains and seed), checked when reading
+    """
+    
+    os.makedirs(directory, exist_ok=True)
+    index = len(glob.glob(os.path.join(directory, "block-*.npz")))
+    path = os.path.join(directory, f"block-{index:06d}.npz")
+    
+    arrays = {
+        "array": data["array"], "columns": data["columns"],
+        "parameters_columns": data["parameters_columns"],
+        **{f"metadata_{k}": v for k, v in metadata.items()}}
+    if data.get("inv_metric") is not None:
+        arrays["inv_metric"] = data["inv_metric"]
+    with open(f"{path}.tmp", "wb") as fd:
+        numpy.savez(fd, **arrays)
+        fd.flush()
+        os.fsync(fd.fileno())
+    os.replace(f"{path}.tmp", path)
+
+def read_checkpoint(directory, metadata):
+    """ Read all blocks of a checkpoint directory, as the output of a single
+        sampler run, or None if no block was written.
+        
+        :param metadata: metadata of the current run, as passed to
+            write_checkpoint. A ValueError is raised if a block was written
+            by a different run, or if its columns differ from the ones of the
+            first block.
+    """
+    
+    paths = sorted(glob.glob(os.path.join(directory, "block-*.npz")))
+    if not paths:
+        return None
+    
+    arrays = []
+    columns = None
+    for path in paths:
+        with numpy.load(path) as block:
+            for key, value in metadata.items():
+                stored = (
+                    block[f"metadata_{key}"].item()
+                    if f"metadata_{key}" in block.files else None)
+                if stored != value:
+                    raise ValueError(
+                        f"Checkpoint {path} does not match the model: "
+                        f"{key} is {stored!r}, expected {value!r}")
+            if columns is None:
+                columns = block["columns"].tolist()
+            elif block["columns"].tolist() != columns:
+                raise ValueError(
+                    f"Checkpoint {path} does not match the previous blocks: "
+                    "different columns")
+            
+            arrays.append(block["array"])
+            data = {
+                "columns": columns,
+                "parameters_columns": block["parameters_columns"].tolist()}
+            if "inv_metric" in block.files:
+                data["inv_metric"] = block["inv_metric"]
+    data["array"] = numpy.concatenate(arrays, axis=2)
+    return data
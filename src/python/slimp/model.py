@@ -1,8 +1,17 @@
+import collections
+import concurrent.futures
+import copy
+import functools
+import importlib
+import os
+import re
+
 import formulaic
 import numpy
 import pandas
 
-from . import _slimp, action_parameters, misc, stats
+from . import _slimp, action_parameters, misc, serialization, stats
+from .predictor import Predictor
 from .samples import Samples
 
 from . import multilevel, multivariate, univariate
@@ -10,7 +19,22 @@ from . import multilevel, multivariate, univariate
 class Model:
     def __init__(
             self, formula, data, seed=-1, num_chains=1, sampler_parameters=None,
+            sufficient_statistics=False, sort_groups=False, non_centered=False,
             **kwargs):
+        """ :param sufficient_statistics: if True, sample from a likelihood
+                computed on the cross-products of the predictors and outcomes
+                instead of on the individual observations. The posterior is
+                the same, but the cost of each iteration does not depend on the
+                number of observations. Only for univariate and multivariate
+                models.
+            :param sort_groups: if True, sort the observations by group so that
+                the likelihood is computed with one matrix product per group.
+                Only for multilevel models.
+            :param non_centered: if True, use a non-centered parameterization
+                of the modeled coefficients; implies sort_groups. Only for
+                multilevel models.
+        """
+        
         ModelData = None
         if isinstance(formula, str):
             ModelData = univariate.ModelData
@@ -19,9 +43,20 @@ class Model:
                 ModelData = multilevel.ModelData
             else:
                 ModelData = multivariate.ModelData
-        self._model_data = ModelData(formula, data)
         self._model_name = ModelData.__module__.split(".")[1]
         
+        self._model_options = {
+            name: value for name, value in [
+                ("sufficient_statistics", sufficient_statistics),
+                ("sort_groups", sort_groups), ("non_centered", non_centered)]
+            if value}
+        unsupported = set(self._model_options) - set(ModelData.options)
+        if unsupported:
+            raise ValueError(
+                f"Not available for {self._model_name} models: "
+                f"{', '.join(sorted(unsupported))}")
+        self._model_data = ModelData(formula, data, **self._model_options)
+        
         if sampler_parameters is None:
             self._sampler_parameters = action_parameters.Sample(
                 seed=seed, num_chains=num_chains, **kwargs)
@@ -71,7 +106,7 @@ class Model:
     @property
     def posterior_epred(self):
         if "mu_posterior" not in self._generated_quantities:
-            draws = self._generate_quantities("predict_posterior")
+            draws = self._predict_posterior()
             self._generated_quantities["mu_posterior"] = draws.filter(like="mu")
             self._generated_quantities["y_posterior"] = draws.filter(like="y")
         return self._generated_quantities["mu_posterior"]
@@ -86,7 +121,7 @@ class Model:
     @property
     def log_likelihood(self):
         if "log_likelihood" not in self._generated_quantities:
-            draws = self._generate_quantities("log_likelihood")
+            draws = self._generate_log_likelihood()
             self._generated_quantities["log_likelihood"] = draws.filter(like="log_likelihood")
         return self._generated_quantities["log_likelihood"]
     
@@ -95,25 +130,192 @@ class Model:
         return stats.hmc_diagnostics(
             self._samples.diagnostics, self._sampler_parameters.hmc.max_depth)
     
-    def sample(self, sampler=None):
+    def sample(
+            self, sampler=None, warm_start=None, target_ess=None,
+            max_samples=None, checkpoint=None, checkpoint_every=100,
+            storage=None):
+        """ Sample the parameters of the model.
+            
+            :param sampler: sampling function, defaults to the one of the model,
+                with the likelihood computed from sufficient statistics or by
+                group if requested at construction, or split over threads if
+                threads_per_chain is greater than 1
+            :param warm_start: previously-sampled model with the same formula.
+                The chains start from its last draws, adapted step sizes and
+                inverse metrics. The warmup of the sampler parameters may then
+                be short, or 0 to skip adaptation altogether.
+            :param target_ess: if given, sample by increments of num_samples
+                draws per chain, each increment continuing the chains from
+                their current state and adaptation, until the bulk effective
+                sample size of every parameter reaches target_ess and its
+                rank-normalized Rhat is below 1.01. Requires a diagonal metric.
+            :param max_samples: maximum number of draws per chain when
+                target_ess is given, defaults to 10 times num_samples
+            :param checkpoint: if given, directory where blocks of
+                checkpoint_every draws per chain are written as they are
+                sampled, with the state of the chains at their end. If the
+                directory already contains blocks, e.g. from an interrupted
+                run with the same model and parameters, sampling resumes after
+                the last one, without warmup. Blocks of another model, data,
+                number of chains, seed, number of warmup or sampling draws,
+                thinning or block size raise a ValueError. Requires a diagonal
+                metric.
+            :param checkpoint_every: number of draws per chain in each block
+            :param storage: if given, path to a .npy file to which the draws
+                are directly written, as a memory-mapped array, instead of
+                being stored in memory. The draws are then read from the file
+                when needed. Cannot be combined with target_ess or checkpoint.
+            :return: number of draws per chain
+        """
+        
+        options = self._model_options
+        segments = options.get("sort_groups") or options.get("non_centered")
+        fit_data = (
+            self._model_data.sorted_data() if segments
+            else self._model_data.fit_data)
+        
         if sampler is None:
-            sampler = getattr(_slimp, f"{self._model_name}_sampler")
-        data = sampler(self._model_data.fit_data, self._sampler_parameters)
-        self._samples = Samples(
-            misc.sample_data_as_xarray(data),
-            self._model_data.predictor_mapper, data["parameters_columns"])
-        self._generated_quantities = {}
+            if options.get("sufficient_statistics"):
+                kind = "sufficient_"
+            elif segments:
+                kind = "segment_"
+            elif self._sampler_parameters.threads_per_chain > 1:
+                kind = "parallel_"
+            else:
+                kind = ""
+            sampler = self._native(f"{kind}sampler")
+        if storage is not None:
+            if target_ess is not None or checkpoint is not None:
+                raise ValueError(
+                    "storage cannot be combined with target_ess or checkpoint")
+            storage = functools.partial(
+                numpy.lib.format.open_memmap, storage, "w+", float)
+        if (
+                (target_ess is not None or checkpoint is not None)
+                and self._sampler_parameters.metric == "dense_e"):
+            # NOTE: fail before the warmup, instead of at the first increment
+            raise ValueError(
+                "target_ess and checkpoint require a diagonal metric")
+        
+        parameters = copy.deepcopy(self._sampler_parameters)
+        if target_ess is None:
+            max_samples = parameters.num_samples
+        elif max_samples is None:
+            max_samples = 10*parameters.num_samples
+        increment = (
+            parameters.num_samples if checkpoint is None
+            else min(parameters.num_samples, checkpoint_every))
+        
+        # Identity of the run, so that blocks of another model, data or
+        # sampler parameters are not resumed
+        metadata = {
+            "formula": repr(self.formula), "data": misc.digest(fit_data),
+            "num_chains": parameters.num_chains, "seed": parameters.seed,
+            "num_warmup": parameters.num_warmup,
+            "num_samples": parameters.num_samples, "thin": parameters.thin,
+            "checkpoint_every": increment}
+        data = (
+            None if checkpoint is None
+            else misc.read_checkpoint(checkpoint, metadata))
+        if data is None:
+            parameters.num_samples = min(increment, max_samples)
+            extra = {} if storage is None else {"storage": storage}
+            if warm_start is None:
+                data = sampler(fit_data, parameters, **extra)
+            else:
+                data = sampler(
+                    fit_data, parameters, warm_start._warm_start(), **extra)
+            if checkpoint is not None:
+                misc.write_checkpoint(checkpoint, data, metadata)
+        self._set_samples(data)
+        
+        # Continue the chains from their current state and adaptation
+        parameters.num_warmup = 0
+        seed = self._sampler_parameters.seed
+        while (
+                data["array"].shape[2] < max_samples
+                and (
+                    target_ess is None or not self._has_converged(target_ess))):
+            # NOTE: the seed only depends on the number of previous draws, so
+            # that a resumed run matches an uninterrupted one, and a fixed seed
+            # does not replay the same random stream.
+            if seed >= 0:
+                parameters.seed = seed + data["array"].shape[2]
+            parameters.num_samples = min(
+                increment, max_samples - data["array"].shape[2])
+            
+            increment_data = sampler(fit_data, parameters, self._warm_start())
+            if increment_data["columns"] != data["columns"]:
+                raise ValueError("Draws do not match the previous draws")
+            if checkpoint is not None:
+                misc.write_checkpoint(checkpoint, increment_data, metadata)
+            data = {
+                **increment_data,
+                "array": numpy.concatenate(
+                    [data["array"], increment_data["array"]], axis=2)}
+            self._set_samples(data)
+        
+        return data["array"].shape[2]
+    
+    def optimize(self, jacobian=False, iterations=2000):
+        """ Find the posterior mode with L-BFGS. The mode is stored as a
+            single draw.
+            
+            :param jacobian: whether to apply the Jacobian of the constraining
+                transforms, i.e. to find the mode in unconstrained space
+                instead of the maximum a posteriori estimate
+            :param iterations: maximum number of L-BFGS iterations
+        """
+        
+        self._approximate("optimize", jacobian=jacobian, iterations=iterations)
+    
+    def laplace(self, draws=1000, iterations=2000):
+        """ Approximate the posterior by a normal distribution centered on its
+            mode in unconstrained space.
+            
+            :param draws: number of draws from the approximation
+            :param iterations: maximum number of L-BFGS iterations used to
+                find the mode
+        """
+        
+        self._approximate("laplace", draws=draws, iterations=iterations)
+    
+    def pathfinder(self, paths=4, draws=1000, iterations=1000):
+        """ Approximate the posterior with multi-path Pathfinder variational
+            inference.
+            
+            :param paths: number of single-path Pathfinder runs
+            :param draws: number of draws, after importance resampling
+            :param iterations: maximum number of L-BFGS iterations of each path
+        """
+        
+        self._approximate(
+            "pathfinder", paths=paths, draws=draws, iterations=iterations)
+    
+    def summary(self, percentiles=(5, 50, 95), rank_normalized=False):
+        # NOTE: summarize all columns and select afterwards, so that
+        # memory-mapped samples are not copied
+        summary = stats.summary(
+            self._samples.samples, percentiles, rank_normalized)
+        return summary.loc[["lp__", *self._samples.parameters]]
     
-    def summary(self, percentiles=(5, 50, 95)):
-        return stats.summary(
-            self._samples.samples.sel(
-                parameter=["lp__", *self._samples.draws.columns]),
-            percentiles)
+    def posterior_epred_summary(self, percentiles=(5, 50, 95)):
+        """ Summary of the posterior expectation of each observation, computed
+            without storing all draws.
+        """
+        
+        summary = self._summarize_quantities("predict_posterior", percentiles)
+        return summary.filter(like="mu", axis="index")
     
-    def predict(self, data, long=False):
+    def predict(self, data, long=False, summary=False, percentiles=(5, 50, 95)):
         predictors = self._model_data.new_predictors(data)
-        draws = self._generate_quantities(
-            "predict_posterior", predictors.values)
+        if summary:
+            # NOTE: the draws are summarized as they are generated
+            summary = self._summarize_quantities(
+                "predict_posterior", percentiles, X_new=predictors.values)
+            return [summary.filter(like=x, axis="index") for x in ["mu", "y"]]
+        
+        draws = self._predict_posterior(predictors.values)
         if long:
             index = pandas.DataFrame(
                 numpy.tile(data, (2*self.outcomes.shape[1], 1)),
@@ -136,38 +338,442 @@ class Model:
         else:
             return draws.filter(like="mu"), draws.filter(like="y")
     
+    def save(self, path, dtype=float):
+        """ Save the model to a directory, in a columnar format which is loaded
+            without re-computing the model matrices, see load.
+            
+            :param path: destination directory, created if needed
+            :param dtype: type of the stored draws and generated quantities,
+                e.g. numpy.float32 to halve the size of the files
+        """
+        
+        os.makedirs(os.path.join(path, "generated_quantities"), exist_ok=True)
+        metadata = {
+            "formula": self._model_data.formula,
+            "model_name": self._model_name,
+            "model_options": self._model_options,
+            "sampler_parameters": self._sampler_parameters,
+            "data": serialization.write_frame(
+                os.path.join(path, "data"), self.data),
+            "matrices": {
+                name: serialization.write_frame(
+                    os.path.join(path, "matrices", name), matrix)
+                for name, matrix in self._model_data.model_matrices().items()},
+            "generated_quantities": {}}
+        
+        if self._samples is not None:
+            serialization.write_array(
+                os.path.join(path, "samples.npy"), self._samples.samples,
+                dtype)
+            if self._samples.inv_metric is not None:
+                serialization.write_array(
+                    os.path.join(path, "inv_metric.npy"),
+                    self._samples.inv_metric)
+            metadata["samples"] = {
+                "columns": self._samples.samples["parameter"].values.tolist(),
+                "parameters_columns": self._samples.parameters_columns,
+                "inv_metric": self._samples.inv_metric is not None}
+        
+        for name, quantity in self._generated_quantities.items():
+            serialization.write_array(
+                os.path.join(path, "generated_quantities", f"{name}.npy"),
+                quantity.values, dtype)
+            metadata["generated_quantities"][name] = quantity.columns
+        
+        # NOTE: the metadata is written last, so that an interrupted save is
+        # not mistaken for a complete one
+        serialization.write_metadata(
+            os.path.join(path, "model.pickle"), metadata)
+    
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Load a model saved by save.
+            
+            :param path: source directory
+            :param mmap: if True, the draws and generated quantities are
+                memory-mapped, and only read from disk when needed
+        """
+        
+        metadata = serialization.read_metadata(
+            os.path.join(path, "model.pickle"))
+        
+        data = serialization.read_frame(
+            os.path.join(path, "data"), metadata["data"], mmap)
+        matrices = {
+            name: serialization.read_frame(
+                os.path.join(path, "matrices", name), item, mmap)
+            for name, item in metadata["matrices"].items()}
+        ModelData = {
+            "univariate": univariate.ModelData,
+            "multivariate": multivariate.ModelData,
+            "multilevel": multilevel.ModelData}[metadata["model_name"]]
+        
+        model = cls.__new__(cls)
+        model._model_name = metadata["model_name"]
+        model._model_options = metadata["model_options"]
+        model._model_data = ModelData(
+            metadata["formula"], data, matrices=matrices,
+            **model._model_options)
+        model._sampler_parameters = metadata["sampler_parameters"]
+        
+        model._samples = None
+        if "samples" in metadata:
+            samples = misc.sample_data_as_xarray({
+                "array": serialization.read_array(
+                    os.path.join(path, "samples.npy"), mmap),
+                "columns": metadata["samples"]["columns"]})
+            inv_metric = (
+                serialization.read_array(
+                    os.path.join(path, "inv_metric.npy"), mmap)
+                if metadata["samples"]["inv_metric"] else None)
+            model._samples = Samples(
+                samples, model._model_data.predictor_mapper,
+                metadata["samples"]["parameters_columns"], inv_metric)
+        
+        model._generated_quantities = {
+            name: pandas.DataFrame(
+                serialization.read_array(
+                    os.path.join(path, "generated_quantities", f"{name}.npy"),
+                    mmap),
+                columns=columns)
+            for name, columns in metadata["generated_quantities"].items()}
+        
+        return model
+    
+    def _warm_start(self):
+        """ Adapted state of the chains, used to warm-start another model """
+        
+        if self._samples is None:
+            raise ValueError("Model has not been sampled")
+        if self._samples.inv_metric is None:
+            raise ValueError("Model has no adapted metric")
+        if self._samples.inv_metric.ndim != 2:
+            raise ValueError("Warm start requires a diagonal metric")
+        
+        last_draw = self._samples.samples.isel(sample=-1)
+        parameters = self._samples.predictor_mapper(
+            self._samples.parameters_columns)
+        return {
+            "stepsize": last_draw.sel(parameter="stepsize__").values,
+            "inv_metric": numpy.ascontiguousarray(self._samples.inv_metric),
+            "init": numpy.ascontiguousarray(
+                last_draw.sel(parameter=parameters).values.T)}
+    
+    def predict_iter(self, data, chunk_size=10000, num_workers=None, out=None):
+        """ Posterior expectation and predictions on new data, chunk by chunk.
+            
+            The predictors specification is built once, and the chunks are
+            processed on a thread pool, with at most num_workers chunks in
+            memory at once.
+            
+            :param data: data frame of new observations
+            :param chunk_size: number of observations in each chunk
+            :param num_workers: number of threads, defaults to the number of
+                CPUs
+            :param out: optional writable array (e.g. numpy.memmap, zarr or
+                h5py array), of shape 2 × draws × outcomes × observations, in
+                which the expectation (index 0) and predictions (index 1) are
+                also written
+            :return: generator of (mu, y) data frames, as returned by predict,
+                with columns numbered relative to the whole data
+        """
+        
+        num_workers = num_workers or os.cpu_count()
+        spec = self._model_data.new_predictors_spec()
+        seed = self._sampler_parameters.seed
+        
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+            pending = collections.deque()
+            for start in range(0, len(data), chunk_size):
+                pending.append(executor.submit(
+                    self._predict_chunk, data.iloc[start:start+chunk_size],
+                    start, spec, [seed, start] if seed >= 0 else None, out))
+                # Bound the number of chunks in memory
+                if len(pending) == num_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def freeze(self, draws=None, dtype=float):
+        """ Lightweight predictor of the posterior expectation and predictions
+            on new data, for serving. The centering of the predictors is folded
+            in the intercepts, and only the coefficients and the residual
+            scale are kept. Only for univariate and multivariate models.
+            
+            :param draws: optional number of draws to keep, evenly spaced in
+                the posterior draws
+            :param dtype: floating-point type of the draws, e.g. numpy.float32
+            :return: a Predictor
+        """
+        
+        if self._model_name not in ["univariate", "multivariate"]:
+            raise ValueError(f"Not available for {self._model_name} models")
+        if self._samples is None:
+            raise ValueError("Model has not been sampled")
+        
+        fit_data = self._model_data.fit_data
+        X = numpy.asarray(fit_data["X"], float)
+        K = numpy.atleast_1d(fit_data["K"])
+        R = len(K)
+        
+        parameters = self._linear_parameters()
+        alpha_c, beta, sigma = [
+            parameters[x] for x in ["alpha_c", "beta", "sigma"]]
+        D = alpha_c.shape[1]
+        kept = (
+            slice(None) if draws is None
+            else numpy.linspace(0, D-1, draws).round().astype(int))
+        
+        coefficients = []
+        begin, begin_c = 0, 0
+        for r, k in enumerate(K):
+            X_bar = X[:, begin+1:begin+k].mean(axis=0)
+            beta_r = beta[begin_c:begin_c+k-1, kept]
+            coefficients.append(
+                numpy.vstack([alpha_c[r, kept] - X_bar @ beta_r, beta_r]))
+            begin += k
+            begin_c += k-1
+        
+        # Cholesky factor of the residual covariance: diag(sigma) × L
+        scale = sigma.T[kept, :, None] * numpy.eye(R)
+        if fit_data.get("use_covariance", False):
+            scale = scale @ (
+                parameters["L"].reshape((R, R, D), order="F")
+                .transpose(2, 0, 1)[kept])
+        
+        specs = self._model_data.new_predictors_spec()
+        return Predictor(
+            specs if isinstance(specs, list) else [specs],
+            self._model_data.data.iloc[:0], coefficients, scale, dtype)
+    
+    def _predict_chunk(self, data, start, spec, seed, out):
+        predictors = self._model_data.new_predictors(data, spec)
+        draws = self._predict_posterior(predictors.values, seed)
+        
+        if out is not None:
+            out[:, :, :, start:start+len(data)] = (
+                draws.values
+                .reshape(len(draws), 2, self.outcomes.shape[1], len(data))
+                .transpose(1, 0, 2, 3))
+        
+        # Number observations relative to the whole data
+        draws.columns = [
+            re.sub(
+                r"^([^.]+)\.(\d+)", lambda m: f"{m[1]}.{int(m[2])+start}", x)
+            for x in draws.columns]
+        
+        return draws.filter(like="mu"), draws.filter(like="y")
+    
+    def _predict_posterior(self, X_new=None, seed=None):
+        """ Posterior expectation and predictions, computed with NumPy for the
+            linear models and with Stan otherwise.
+        """
+        
+        if self._model_name in ["univariate", "multivariate"]:
+            return self._linear_predict_posterior(X_new, seed)
+        else:
+            return self._generate_quantities("predict_posterior", X_new=X_new)
+    
+    def _linear_predict_posterior(self, X_new=None, seed=None):
+        """ Vectorized equivalent of the predict_posterior Stan program of the
+            univariate and multivariate models: µ is computed with one matrix
+            product per outcome, and y is drawn with a NumPy generator.
+        """
+        
+        fit_data = self._model_data.fit_data
+        X = numpy.asarray(fit_data["X"], float)
+        X_new = X if X_new is None else numpy.asarray(X_new, float)
+        K = numpy.atleast_1d(fit_data["K"])
+        R, N = len(K), len(X_new)
+        
+        parameters = self._linear_parameters()
+        alpha_c, beta, sigma = [
+            parameters[x] for x in ["alpha_c", "beta", "sigma"]]
+        D = alpha_c.shape[1]
+        
+        # NOTE: mu and y are views on the final array to avoid copies
+        result = numpy.empty((D, 2, R, N))
+        mu, y = result[:, 0], result[:, 1]
+        
+        begin, begin_c = 0, 0
+        for r, k in enumerate(K):
+            # Center the predictors around the *original* predictors, except
+            # for the first (intercept) column
+            X_bar = X[:, begin+1:begin+k].mean(axis=0)
+            X_c_new = X_new[:, begin+1:begin+k] - X_bar
+            numpy.matmul(beta[begin_c:begin_c+k-1].T, X_c_new.T, out=mu[:, r])
+            mu[:, r] += alpha_c[r][:, None]
+            begin += k
+            begin_c += k-1
+        
+        if seed is None:
+            seed = self._sampler_parameters.seed
+            seed = seed if seed >= 0 else None
+        generator = numpy.random.default_rng(seed)
+        noise = generator.standard_normal(mu.shape)
+        if fit_data.get("use_covariance", False):
+            # Cholesky factor of the covariance: diag(sigma) × L
+            L = (
+                parameters["L"].reshape((R, R, D), order="F")
+                .transpose(2, 0, 1))
+            numpy.einsum(
+                "dij,djn->din", sigma.T[:, :, None]*L, noise, out=y)
+            y += mu
+        else:
+            numpy.multiply(sigma.T[:, :, None], noise, out=y)
+            y += mu
+        
+        if self._model_name == "univariate":
+            columns = [f"{x}.{1+n}" for x in ["mu", "y"] for n in range(N)]
+        else:
+            columns = [
+                f"{x}.{1+n}.{1+r}"
+                for x in ["mu", "y"] for r in range(R) for n in range(N)]
+        
+        return pandas.DataFrame(result.reshape(D, -1), columns=columns)
+    
+    def _linear_parameters(self):
+        """ Draws of the parameters of the univariate and multivariate models,
+            by Stan name, each of shape elements × draws
+        """
+        
+        names = self._parameters_names()
+        values = (
+            self._samples.samples
+            .sel(parameter=self._samples.predictor_mapper(names))
+            .values.reshape(len(names), -1))
+        return {
+            name: values[[
+                index for index, x in enumerate(names)
+                if x == name or x.startswith(f"{name}.")]]
+            for name in ["alpha_c", "beta", "sigma", "L"]}
+    
+    def _native(self, name):
+        """ Native function of the model family, from its extension module
+            which is only imported on first use
+        """
+        
+        module = importlib.import_module(f"._{self._model_name}", __package__)
+        return getattr(module, f"{self._model_name}_{name}")
+    
+    def _approximate(self, name, **kwargs):
+        """ Run an approximate inference, and store its draws as a single
+            chain
+        """
+        
+        data = self._native(name)(
+            self._model_data.fit_data, self._sampler_parameters, **kwargs)
+        self._set_samples(data)
+    
+    def _set_samples(self, data):
+        """ Store the output of a sampler, and invalidate the generated
+            quantities
+        """
+        
+        self._samples = Samples(
+            misc.sample_data_as_xarray(data),
+            self._model_data.predictor_mapper, data["parameters_columns"],
+            data.get("inv_metric"))
+        self._generated_quantities = {}
+    
+    def _has_converged(self, target_ess):
+        """ Whether the bulk effective sample size of every parameter reaches
+            target_ess and its rank-normalized Rhat is below 1.01. Constant
+            parameters (e.g. fixed entries of Cholesky factors), whose
+            diagnostics are undefined, are ignored.
+        """
+        
+        # NOTE: the sampler diagnostics come first and are followed by the
+        # parameters, so that a slice, unlike a list of names, does not copy
+        # the draws
+        names = self._samples.samples["parameter"].values
+        begin = next(
+            index for index, x in enumerate(names) if not x.endswith("_"))
+        draws = self._samples.samples.isel(parameter=slice(begin, None))
+        diagnostics = _slimp.get_rank_normalized_diagnostics(
+            numpy.asarray(draws, float))
+        diagnostics = diagnostics[numpy.isfinite(diagnostics[:, 0])]
+        return bool(
+            numpy.all(diagnostics[:, 0] < 1.01)
+            and numpy.all(diagnostics[:, 1] >= target_ess))
+    
     def _generate_quantities(
             self, name, converter=misc.sample_data_as_df, *args, **kwargs):
         new_data = self._model_data.new_data(*args, **kwargs)
+        data = self._native(name)(
+            new_data, self._parameters_draws(), self._sampler_parameters)
         
-        # NOTE: must only include model parameters
-        draws = self._samples.samples.sel(
-            parameter=self._samples.predictor_mapper(
-                self._samples.parameters_columns))
-        data = getattr(_slimp, f"{self._model_name}_{name}")(
-            new_data, draws, self._sampler_parameters)
+        return converter(data)
+    
+    def _generate_log_likelihood(
+            self, converter=misc.sample_data_as_df, begin=0, end=None,
+            draws=None):
+        """ Pointwise log-likelihood of the observations in [begin, end).
+            
+            :param draws: parameters draws, as returned by _parameters_draws,
+                selected once by callers which evaluate several blocks
+        """
+        
+        if draws is None:
+            draws = self._parameters_draws()
+        data = self._native("log_likelihood")(
+            self._model_data.log_likelihood_data(begin, end), draws,
+            self._sampler_parameters)
         
         return converter(data)
     
+    def _summarize_quantities(self, name, percentiles, *args, **kwargs):
+        new_data = self._model_data.new_data(*args, **kwargs)
+        data = self._native(f"{name}_summary")(
+            new_data, self._parameters_draws(), self._sampler_parameters,
+            [p/100 for p in percentiles])
+        
+        summary = {"Mean": data["mean"], "StdDev": data["sd"]}
+        for p, q in zip(percentiles, data["quantiles"].T):
+            summary[f"{p}%"] = q
+        return pandas.DataFrame(summary, index=data["columns"])
+    
+    def _parameters_names(self):
+        """ Stan names of the model parameters, as expected by the generated
+            quantities: re-parameterized values (e.g. the QR-space coefficients
+            of the multivariate sampler) are replaced by the parameters
+            themselves, which are stored as transformed parameters.
+        """
+        
+        names = []
+        for name in self._samples.parameters_columns:
+            kind, dot, index = name.partition(".")
+            names.append(Samples.reparameterized.get(kind, kind) + dot + index)
+        return names
+    
+    def _parameters_draws(self):
+        # NOTE: must only include model parameters
+        return self._samples.samples.sel(
+            parameter=self._samples.predictor_mapper(self._parameters_names()))
+    
     def __getstate__(self):
         return {
             "formula": self.formula, "data": self.data,
             "sampler_parameters": self._sampler_parameters,
             "model_name": self._model_name,
+            "model_options": self._model_options,
             **(
                 {
                     "samples": self._samples.samples,
-                    "parameters_columns": self._samples.parameters_columns}
+                    "parameters_columns": self._samples.parameters_columns,
+                    "inv_metric": self._samples.inv_metric}
                 if self._samples is not None else {}),
             "generated_quantities": self._generated_quantities
         }
     
     def __setstate__(self, state):
-        self.__init__(state["formula"], state["data"])
+        self.__init__(
+            state["formula"], state["data"],
+            **state.get("model_options", {}))
         self._sampler_parameters = state["sampler_parameters"]
         self._model_name = state["model_name"]
         if "samples" in state:
             self._samples = Samples(
                 state["samples"], self._model_data.predictor_mapper,
-                state["parameters_columns"])
+                state["parameters_columns"], state.get("inv_metric"))
         self._generated_quantities = state["generated_quantities"]
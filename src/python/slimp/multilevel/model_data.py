@@ -5,20 +5,41 @@ import pandas
 from .predictor_mapper import PredictorMapper
 
 class ModelData:
-    def __init__(self, formula, data):
+    # Keyword arguments of the constructor which are forwarded by Model
+    options = ["sort_groups", "non_centered"]
+    
+    def __init__(
+            self, formula, data, sort_groups=False, non_centered=False,
+            matrices=None):
+        """ :param matrices: model matrices of a previous instance, as returned
+                by model_matrices, used instead of re-computing them
+        """
+        
         self.formula = formula
         self.data = data
-        
-        self.outcomes, self.unmodeled_predictors = formulaic.model_matrix(
-            formula[0], data)
+        self.sort_groups = sort_groups or non_centered
+        self.non_centered = non_centered
         
         group_name, group_formula = formula[1]
-        self.modeled_predictors = formulaic.model_matrix(group_formula, data)
-        self.modeled_predictors.index = data[group_name]
+        if matrices is None:
+            self.outcomes, self.unmodeled_predictors = formulaic.model_matrix(
+                formula[0], data)
+            self.modeled_predictors = formulaic.model_matrix(
+                group_formula, data)
+            self.modeled_predictors.index = data[group_name]
+        else:
+            self.outcomes = matrices["outcomes"]
+            self.unmodeled_predictors = matrices["unmodeled_predictors"]
+            self.modeled_predictors = matrices["modeled_predictors"]
         
         self.predictor_mapper = PredictorMapper(
             self.unmodeled_predictors, self.modeled_predictors, self.outcomes)
         
+        # Center of the non-intercept unmodeled predictors, used by the
+        # log-likelihood
+        self.X0_bar = numpy.mean(
+            self.unmodeled_predictors.values[:, 1:], axis=0)
+        
         mu_y = numpy.mean(self.outcomes.values)
         sigma_y = numpy.std(self.outcomes.values)
         sigma_X = numpy.std(
@@ -44,11 +65,53 @@ class ModelData:
             "lambda_sigma_Beta": 1/sigma_y,
             
             "eta_L": 1.}
+        
+        if self.sort_groups:
+            self.fit_data["group_size"] = numpy.bincount(
+                self.fit_data["group"], minlength=1+self.fit_data["J"])[1:]
+            self.fit_data["non_centered"] = int(non_centered)
+    
+    def sorted_data(self):
+        """ Fit data with the observations sorted by group, as expected by the
+            segment sampler
+        """
+        
+        order = numpy.argsort(self.fit_data["group"].values, kind="stable")
+        return self.fit_data | {
+            name: self.fit_data[name].iloc[order]
+            for name in ["y", "X0", "X", "group"]}
     
     @property
     def predictors(self):
         return (self.unmodeled_predictors, self.modeled_predictors)
     
+    def model_matrices(self):
+        """ Model matrices, by name """
+        return {
+            "outcomes": self.outcomes,
+            "unmodeled_predictors": self.unmodeled_predictors,
+            "modeled_predictors": self.modeled_predictors}
+    
+    def batch_data(self, outcomes):
+        """ Per-task data for outcomes of shape tasks × observations: the
+            outcomes and the priors which depend on them.
+        """
+        
+        outcomes = numpy.asarray(outcomes, float)
+        
+        mu_y = numpy.mean(outcomes, axis=1)
+        sigma_y = numpy.std(outcomes, axis=1)
+        sigma_X = numpy.std(
+            self.unmodeled_predictors.filter(regex="^(?!.*Intercept)").values,
+            axis=0)
+        
+        return {
+            "y": outcomes,
+            "mu_alpha": mu_y, "sigma_alpha": 2.5*sigma_y,
+            "sigma_beta": 2.5*sigma_y[:, None]/sigma_X,
+            "lambda_sigma_y": 1/sigma_y,
+            "lambda_sigma_Beta": 1/sigma_y}
+    
     def new_data(self, X0_new=None, X_new=None):
         if X0_new is None:
             X0_new = self.fit_data["X0"]
@@ -57,3 +120,17 @@ class ModelData:
         
         return self.fit_data | {
             "N_new": X0_new.shape[0], "X0_new": X0_new, "X_new": X_new}
+    
+    def log_likelihood_data(self, begin=0, end=None):
+        """ Data of the log-likelihood of the observations in [begin, end),
+            centered around the original unmodeled predictors
+        """
+        
+        X0 = self.fit_data["X0"].iloc[begin:end]
+        return {
+            "N": X0.shape[0], "K0": self.fit_data["K0"],
+            "K": self.fit_data["K"], "J": self.fit_data["J"],
+            "y": self.fit_data["y"].iloc[begin:end], "X0": X0,
+            "X": self.fit_data["X"].iloc[begin:end],
+            "group": self.fit_data["group"].iloc[begin:end],
+            "X0_bar": self.X0_bar}
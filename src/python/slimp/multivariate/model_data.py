@@ -4,18 +4,38 @@ import pandas
 
 from .predictor_mapper import PredictorMapper
 from . import NoCorrelation
+from .. import misc
 
 class ModelData:
-    def __init__(self, formula, data):
+    # Keyword arguments of the constructor which are forwarded by Model
+    options = ["sufficient_statistics"]
+    
+    def __init__(
+            self, formula, data, sufficient_statistics=False, matrices=None):
+        """ :param matrices: model matrices of a previous instance, as returned
+                by model_matrices, used instead of re-computing them
+        """
+        
         self.formula = formula
         self.data = data
+        self.sufficient_statistics = sufficient_statistics
         
-        self.outcomes, self.predictors = zip(
-            *[formulaic.model_matrix(f, data) for f in formula])
-        self.outcomes = pandas.concat(self.outcomes, axis="columns")
+        if matrices is None:
+            self.outcomes, self.predictors = zip(
+                *[formulaic.model_matrix(f, data) for f in formula])
+            self.outcomes = pandas.concat(self.outcomes, axis="columns")
+        else:
+            self.outcomes = matrices["outcomes"]
+            self.predictors = tuple(
+                matrices[f"predictors.{i}"] for i in range(len(formula)))
         
         self.predictor_mapper = PredictorMapper(self.predictors, self.outcomes)
         
+        # Center of the non-intercept predictors of each outcome, used by the
+        # log-likelihood
+        self.X_bar = numpy.hstack([
+            numpy.mean(x.values[:, 1:], axis=0) for x in self.predictors])
+        
         mu_y = numpy.mean(self.outcomes.values, axis=0)
         sigma_y = numpy.atleast_1d(numpy.std(self.outcomes.values, axis=0))
         sigma_X = [
@@ -36,20 +56,68 @@ class ModelData:
             "lambda_sigma": numpy.squeeze(1/sigma_y),
             "eta_L": 1.0,
             "use_covariance": not isinstance(formula, NoCorrelation)}
+        
+        if sufficient_statistics:
+            self.fit_data["Xy_bar"], self.fit_data["Xy_C"] = misc.comoments([
+                *[x.values[:, 1:] for x in self.predictors],
+                self.outcomes.values])
     
-    def new_predictors(self, data):
-        data = data.astype({
-            k: v for k, v in self.data.dtypes.items() if k in data.columns})
-        predictors = []
-        for formula in self.formula:
-            predictors.append(
-                formulaic.model_matrix(formula.split("~")[1], data))
-        predictors = pandas.concat(predictors, axis="columns")
-        return predictors
+    def batch_data(self, outcomes):
+        """ Per-task data for outcomes of shape tasks × observations × outcomes:
+            the outcomes and the priors which depend on them.
+        """
         
+        outcomes = numpy.asarray(outcomes, float)
+        
+        mu_y = numpy.mean(outcomes, axis=1)
+        sigma_y = numpy.std(outcomes, axis=1)
+        sigma_X = [
+            numpy.std(x.filter(regex="^(?!.*Intercept)").values, axis=0)
+            for x in self.predictors]
+        
+        return {
+            "y": outcomes,
+            "mu_alpha": mu_y, "sigma_alpha": 2.5*sigma_y,
+            "sigma_beta": numpy.hstack([
+                2.5*(sigma_y[:, r, None]/sx) for r, sx in enumerate(sigma_X)]),
+            "lambda_sigma": 1/sigma_y}
+    
+    def model_matrices(self):
+        """ Model matrices, by name """
+        return {
+            "outcomes": self.outcomes,
+            **{f"predictors.{i}": x for i, x in enumerate(self.predictors)}}
+    
+    def new_predictors_spec(self):
+        """ Model specs of the predictors, re-usable on new data """
+        return [x.model_spec for x in self.predictors]
+    
+    def new_predictors(self, data, spec=None):
+        """ Predictors of new data, built from the fitted model specs so that
+            the formulas are not parsed again and that categorical levels match
+            the ones of the fitted data.
+        """
+        
+        data = misc.cast_like(data, self.data)
+        if spec is None:
+            spec = self.new_predictors_spec()
+        return pandas.concat(
+            [x.get_model_matrix(data) for x in spec], axis="columns")
     
     def new_data(self, X_new=None):
         if X_new is None:
             X_new = self.fit_data["X"]
         
         return self.fit_data | { "N_new": X_new.shape[0], "X_new": X_new}
+    
+    def log_likelihood_data(self, begin=0, end=None):
+        """ Data of the log-likelihood of the observations in [begin, end),
+            centered around the original predictors
+        """
+        
+        X = self.fit_data["X"].iloc[begin:end]
+        return {
+            "R": self.fit_data["R"], "N": X.shape[0], "K": self.fit_data["K"],
+            "y": self.outcomes.values[begin:end], "X": X,
+            "X_bar": self.X_bar,
+            "use_covariance": self.fit_data["use_covariance"]}
@@ -0,0 +1,93 @@
+import numpy
+
+from . import misc
+
+class Predictor:
+    """ Posterior expectation and predictions of a linear model on new data,
+        from a fixed set of draws.
+        
+        The predictor only holds contiguous arrays of coefficients and the
+        model specs of the predictors, and is not modified by predictions: it
+        can be shared between threads. Use Model.freeze to create it.
+    """
+    
+    def __init__(self, specs, reference, coefficients, scale, dtype=float):
+        """ :param specs: formulaic model spec of the predictors of each
+                outcome
+            :param reference: data frame with the types of the fitted data
+            :param coefficients: coefficients of each outcome, shape
+                predictors × draws, the intercept including the centering of
+                the predictors
+            :param scale: Cholesky factor of the residual covariance, shape
+                draws × outcomes × outcomes
+            :param dtype: floating-point type of the draws and of the results
+        """
+        
+        self.specs = specs
+        self.reference = reference
+        self.dtype = numpy.dtype(dtype)
+        self.coefficients = [
+            numpy.ascontiguousarray(x, self.dtype) for x in coefficients]
+        self.scale = numpy.ascontiguousarray(scale, self.dtype)
+        
+        # Columns of the predictors of each outcome
+        self._blocks = numpy.cumsum([0, *[len(x) for x in coefficients]])
+    
+    @property
+    def num_draws(self):
+        return self.scale.shape[0]
+    
+    @property
+    def num_outcomes(self):
+        return len(self.coefficients)
+    
+    def predictors(self, data):
+        """ Predictors of new data, shape observations × predictors. They may
+            be passed to epred and predict instead of the data, so that the
+            model matrix is only built once.
+        """
+        
+        data = misc.cast_like(data, self.reference)
+        return numpy.hstack([
+            numpy.asarray(x.get_model_matrix(data), self.dtype)
+            for x in self.specs])
+    
+    def epred(self, data):
+        """ Posterior expectation on new data.
+            
+            :param data: data frame of new observations, or array of their
+                predictors, as returned by predictors
+            :return: array of shape draws × outcomes × observations
+        """
+        
+        if isinstance(data, numpy.ndarray):
+            X = numpy.atleast_2d(numpy.asarray(data, self.dtype))
+        else:
+            X = self.predictors(data)
+        
+        mu = numpy.empty(
+            (self.num_draws, self.num_outcomes, len(X)), self.dtype)
+        for r, coefficients in enumerate(self.coefficients):
+            numpy.matmul(
+                coefficients.T, X[:, self._blocks[r]:self._blocks[r+1]].T,
+                out=mu[:, r])
+        return mu
+    
+    def predict(self, data, seed=None):
+        """ Posterior expectation and predictions on new data.
+            
+            :param data: data frame of new observations, or array of their
+                predictors, as returned by predictors
+            :param seed: optional seed of the predictions noise
+            :return: arrays of expectation and predictions, each of shape
+                draws × outcomes × observations
+        """
+        
+        mu = self.epred(data)
+        
+        generator = numpy.random.default_rng(seed)
+        noise = generator.standard_normal(mu.shape, self.dtype)
+        y = numpy.matmul(self.scale, noise)
+        y += mu
+        
+        return mu, y
@@ -1,7 +1,15 @@
 import pandas
 
 class Samples:
-    def __init__(self, samples, predictor_mapper, parameters_columns):
+    # Stan names of the sampled values which only re-parameterize a parameter
+    # stored as a transformed parameter (e.g. the QR-space coefficients of the
+    # multivariate sampler), and name of that parameter. They are not part of
+    # the parameters.
+    reparameterized = {"Beta_raw": "Beta", "theta": "beta"}
+    
+    def __init__(
+            self, samples, predictor_mapper, parameters_columns,
+            inv_metric=None):
         self.predictor_mapper = predictor_mapper
         
         self.samples = samples
@@ -12,12 +20,30 @@ class Samples:
         diagnostics_names = [x for x in names if x.endswith("_")]
         self.diagnostics = self.samples.sel(parameter=diagnostics_names)
         
-        parameters_names = [x for x in names if not x.endswith("_")]
-        self.draws = pandas.DataFrame(
-            self.samples.sel(parameter=parameters_names)
-                .values
-                .reshape(len(parameters_names), -1)
-                .T,
-            columns=predictor_mapper(parameters_names))
+        # NOTE: the draws are only read from the samples, which may be
+        # memory-mapped, when first needed
+        hidden = set(self.predictor_mapper([
+            x for x in parameters_columns
+            if x.partition(".")[0] in self.reparameterized]))
+        self.parameters = [
+            x for x in names if not x.endswith("_") and x not in hidden]
+        self._draws = None
         
         self.parameters_columns = parameters_columns
+        
+        # Inverse metric of each chain, in unconstrained space: diagonal for
+        # the diag_e and unit_e metrics, full matrix for the dense_e metric
+        self.inv_metric = inv_metric
+    
+    @property
+    def draws(self):
+        """ Draws of the parameters, one column per parameter """
+        
+        if self._draws is None:
+            self._draws = pandas.DataFrame(
+                self.samples.sel(parameter=self.parameters)
+                    .values
+                    .reshape(len(self.parameters), -1)
+                    .T,
+                columns=self.predictor_mapper(self.parameters))
+        return self._draws
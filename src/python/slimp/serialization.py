@@ -0,0 +1,80 @@
+""" Columnar on-disk storage of models, see Model.save and Model.load.
+
+    A model is stored in a directory containing a small pickled metadata file
+    (formula, options, sampler parameters, formulaic model specs, names of
+    columns) and one .npy file per column of data frame and per array, so that
+    the large arrays may be memory-mapped when loading.
+"""
+
+import os
+import pickle
+
+import formulaic
+import numpy
+import pandas
+
+def write_array(path, array, dtype=None):
+    numpy.save(path, numpy.asarray(array, dtype), allow_pickle=True)
+
+def read_array(path, mmap):
+    """ Read an array, memory-mapped if requested and possible """
+    
+    if mmap:
+        try:
+            return numpy.load(path, mmap_mode="r")
+        except ValueError:
+            # NOTE: arrays of Python objects cannot be memory-mapped
+            pass
+    return numpy.load(path, allow_pickle=True)
+
+def write_frame(directory, frame):
+    """ Write the index and each column of a data frame to its own file, and
+        return the metadata required by read_frame.
+    """
+    
+    os.makedirs(directory, exist_ok=True)
+    series = [
+        frame.index.to_series(),
+        *[frame.iloc[:, i] for i in range(frame.shape[1])]]
+    for index, item in enumerate(series):
+        values = (
+            item.cat.codes.values
+            if isinstance(item.dtype, pandas.CategoricalDtype)
+            else item.to_numpy())
+        write_array(os.path.join(directory, f"{index}.npy"), values)
+    
+    return {
+        "columns": frame.columns, "index_name": frame.index.name,
+        "dtypes": [x.dtype for x in series],
+        "model_spec": getattr(frame, "model_spec", None)}
+
+def read_frame(directory, metadata, mmap):
+    """ Read a data frame written by write_frame. Model matrices are restored
+        with their model spec.
+    """
+    
+    series = []
+    for index, dtype in enumerate(metadata["dtypes"]):
+        values = read_array(os.path.join(directory, f"{index}.npy"), mmap)
+        if isinstance(dtype, pandas.CategoricalDtype):
+            values = pandas.Categorical.from_codes(values, dtype=dtype)
+        else:
+            values = pandas.Series(values, copy=False).astype(dtype, copy=False)
+        series.append(values)
+    
+    frame = pandas.DataFrame(
+        dict(enumerate(series[1:])),
+        index=pandas.Index(series[0], name=metadata["index_name"]))
+    frame.columns = metadata["columns"]
+    
+    if metadata["model_spec"] is not None:
+        frame = formulaic.ModelMatrix(frame, model_spec=metadata["model_spec"])
+    return frame
+
+def write_metadata(path, metadata):
+    with open(path, "wb") as fd:
+        pickle.dump(metadata, fd)
+
+def read_metadata(path):
+    with open(path, "rb") as fd:
+        return pickle.load(fd)
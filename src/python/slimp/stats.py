@@ -48,23 +48,121 @@ def hmc_diagnostics(data, max_depth):
                 / numpy.var(energy, axis=1, ddof=1)})
     return diagnostics
 
-def summary(data, percentiles=(5, 50, 95)):
+def summary(data, percentiles=(5, 50, 95), rank_normalized=False):
+    """ Summary statistics of the draws of each parameter.
+        
+        :param data: xarray of draws, with dimensions parameter, chain and
+            sample
+        :param percentiles: percentiles of the draws to report
+        :param rank_normalized: if True, report the rank-normalized split Rhat
+            and the bulk and tail effective sample sizes (Vehtari et al., 2021)
+            instead of the classic ones
+    """
+    
+    # NOTE: all statistics are computed by a single native pass over the draws
+    # of each parameter, in parallel over the parameters. The parameters are
+    # processed by blocks so that memory-mapped draws are never fully loaded.
+    block = max(1, 2**24 // (data.shape[1]*data.shape[2]))
+    blocks = [
+        data.isel(parameter=slice(start, start+block))
+        for start in range(0, data.shape[0], block)]
+    values = numpy.concatenate([
+        _slimp.summary(
+            numpy.ascontiguousarray(x, float), [p/100 for p in percentiles])
+        for x in blocks])
+    
     summary = {}
     
-    summary["Mean"] = numpy.mean(data, axis=(1,2))
+    summary["Mean"] = values[:, 0]
     summary["MCSE"] = None
-    summary["StdDev"] = numpy.std(data, axis=(1,2))
-    quantiles = numpy.quantile(data, numpy.array(percentiles)/100, axis=(1,2))
-    for p, q in zip(percentiles, quantiles):
+    summary["StdDev"] = values[:, 1]
+    for p, q in zip(percentiles, values[:, 2:-2].T):
         summary[f"{p}%"] = q
     
-    summary["N_Eff"] = _slimp.get_effective_sample_size(data)
-    summary["R_hat"] = _slimp.get_split_potential_scale_reduction(data)
+    if rank_normalized:
+        # NOTE: the draws are read through their strides, without copy
+        diagnostics = numpy.concatenate([
+            _slimp.get_rank_normalized_diagnostics(numpy.asarray(x, float))
+            for x in blocks])
+        summary["ESS_bulk"] = diagnostics[:, 1]
+        summary["ESS_tail"] = diagnostics[:, 2]
+        summary["R_hat"] = diagnostics[:, 0]
+        ess = summary["ESS_bulk"]
+    else:
+        summary["N_Eff"] = values[:, -2]
+        summary["R_hat"] = values[:, -1]
+        ess = summary["N_Eff"]
     
-    summary["MCSE"] = numpy.sqrt(summary["StdDev"])/numpy.sqrt(summary["N_Eff"])
+    summary["MCSE"] = numpy.sqrt(summary["StdDev"])/numpy.sqrt(ess)
     
     return pandas.DataFrame(summary, index=data["parameter"])
 
+def loo(model, block_size=None):
+    """ Pareto-smoothed importance sampling leave-one-out cross-validation
+        (Vehtari et al., Practical Bayesian model evaluation using leave-one-out
+        cross-validation and WAIC, 2017).
+        
+        :param model: sampled model
+        :param block_size: number of observations of which the log-likelihood
+            is generated at once, see _pointwise_loo_waic
+        :return: estimates of elpd_loo, p_loo and looic with their standard
+            errors, and their pointwise values along with the shape parameter
+            of the Pareto-smoothed weights
+    """
+    
+    pointwise = _pointwise_loo_waic(model, block_size)
+    pointwise = pointwise[["elpd_loo", "p_loo", "pareto_k"]].assign(
+        looic=-2*pointwise["elpd_loo"])
+    return _information_criterion(pointwise, ["elpd_loo", "p_loo", "looic"])
+
+def waic(model, block_size=None):
+    """ Widely applicable information criterion (Watanabe, 2010).
+        
+        :param model: sampled model
+        :param block_size: number of observations of which the log-likelihood
+            is generated at once, see _pointwise_loo_waic
+        :return: estimates of elpd_waic, p_waic and waic with their standard
+            errors, and their pointwise values
+    """
+    
+    pointwise = _pointwise_loo_waic(model, block_size)
+    pointwise = pointwise[["elpd_waic", "p_waic"]].assign(
+        waic=-2*pointwise["elpd_waic"])
+    return _information_criterion(pointwise, ["elpd_waic", "p_waic", "waic"])
+
+def _pointwise_loo_waic(model, block_size=None):
+    """ Pointwise LOO and WAIC criteria. The log-likelihood is generated and
+        reduced by blocks of observations, so that the whole draws ×
+        observations matrix is never stored. By default, each block contains
+        about 2²² values.
+    """
+    
+    N = model.fit_data["N"]
+    if block_size is None:
+        block_size = max(1, 2**22 // len(model.draws))
+    
+    # Only the observations of the block are passed to the log-likelihood, and
+    # the draws are selected once for all blocks
+    draws = numpy.ascontiguousarray(model._parameters_draws(), float)
+    
+    blocks = []
+    for begin in range(0, N, block_size):
+        blocks.append(model._generate_log_likelihood(
+            lambda data: _slimp.get_pointwise_loo_waic(data["array"]),
+            begin, min(N, begin+block_size), draws))
+    
+    return pandas.DataFrame(
+        numpy.concatenate(blocks),
+        columns=["elpd_loo", "p_loo", "pareto_k", "elpd_waic", "p_waic"])
+
+def _information_criterion(pointwise, columns):
+    estimates = pandas.DataFrame(
+        {
+            "Estimate": pointwise[columns].sum(),
+            "SE": numpy.sqrt(len(pointwise)*pointwise[columns].var())},
+        index=columns)
+    return estimates, pointwise
+
 def hdi(x, mass):
     """ Highest density interval, after "Doing Bayesian Data Analysis",
         J. Kruschke, section 25.2.3
@@ -3,16 +3,34 @@ import numpy
 import pandas
 
 from .predictor_mapper import PredictorMapper
+from .. import misc
 
 class ModelData:
-    def __init__(self, formula, data):
+    # Keyword arguments of the constructor which are forwarded by Model
+    options = ["sufficient_statistics"]
+    
+    def __init__(
+            self, formula, data, sufficient_statistics=False, matrices=None):
+        """ :param matrices: model matrices of a previous instance, as returned
+                by model_matrices, used instead of re-computing them
+        """
+        
         self.formula = formula
         self.data = data
+        self.sufficient_statistics = sufficient_statistics
         
-        self.outcomes, self.predictors = formulaic.model_matrix(formula, data)
+        if matrices is None:
+            self.outcomes, self.predictors = formulaic.model_matrix(
+                formula, data)
+        else:
+            self.outcomes = matrices["outcomes"]
+            self.predictors = matrices["predictors"]
         
         self.predictor_mapper = PredictorMapper(self.predictors, self.outcomes)
         
+        # Center of the non-intercept predictors, used by the log-likelihood
+        self.X_bar = numpy.mean(self.predictors.values[:, 1:], axis=0)
+        
         mu_y = numpy.mean(self.outcomes.values)
         sigma_y = numpy.std(self.outcomes.values)
         sigma_X = numpy.std(
@@ -25,16 +43,61 @@ class ModelData:
             "mu_alpha": mu_y, "sigma_alpha": 2.5*sigma_y,
             "sigma_beta": 2.5*sigma_y/sigma_X,
             "lambda_sigma": numpy.squeeze(1/sigma_y)}
+        
+        if sufficient_statistics:
+            self.fit_data["Xy_bar"], self.fit_data["Xy_C"] = misc.comoments([
+                self.predictors.values[:, 1:], self.outcomes.values])
+    
+    def batch_data(self, outcomes):
+        """ Per-task data for outcomes of shape tasks × observations: the
+            outcomes and the priors which depend on them.
+        """
+        
+        outcomes = numpy.asarray(outcomes, float)
+        
+        mu_y = numpy.mean(outcomes, axis=1)
+        sigma_y = numpy.std(outcomes, axis=1)
+        sigma_X = numpy.std(
+            self.predictors.filter(regex="^(?!.*Intercept)").values, axis=0)
+        
+        return {
+            "y": outcomes,
+            "mu_alpha": mu_y, "sigma_alpha": 2.5*sigma_y,
+            "sigma_beta": 2.5*sigma_y[:, None]/sigma_X,
+            "lambda_sigma": 1/sigma_y}
+    
+    def model_matrices(self):
+        """ Model matrices, by name """
+        return {"outcomes": self.outcomes, "predictors": self.predictors}
     
-    def new_predictors(self, data):
-        data = data.astype({
-            k: v for k, v in self.data.dtypes.items() if k in data.columns})
-        predictors = pandas.DataFrame(
-            formulaic.model_matrix(self.formula.split("~")[1], data))
-        return predictors
+    def new_predictors_spec(self):
+        """ Model spec of the predictors, re-usable on new data """
+        return self.predictors.model_spec
+    
+    def new_predictors(self, data, spec=None):
+        """ Predictors of new data, built from the fitted model spec so that
+            the formula is not parsed again and that categorical levels match
+            the ones of the fitted data.
+        """
+        
+        data = misc.cast_like(data, self.data)
+        if spec is None:
+            spec = self.new_predictors_spec()
+        return pandas.DataFrame(spec.get_model_matrix(data))
     
     def new_data(self, X_new=None):
         if X_new is None:
             X_new = self.fit_data["X"]
         
         return self.fit_data | { "N_new": X_new.shape[0], "X_new": X_new}
+    
+    def log_likelihood_data(self, begin=0, end=None):
+        """ Data of the log-likelihood of the observations in [begin, end),
+            centered around the original predictors
+        """
+        
+        X = self.fit_data["X"].iloc[begin:end]
+        return {
+            "N": X.shape[0], "K": self.fit_data["K"],
+            "y": self.fit_data["y"].iloc[begin:end], "X": X,
+            "X_bar": self.X_bar}
@@ -111,3 +111,21 @@ BOOST_AUTO_TEST_CASE(Matrix2)
             {1, 2, 3, 7},
             {4, 5, 6, 8}}));
 }
+
+BOOST_AUTO_TEST_CASE(View)
+{
+    std::vector<double> buffer(3*2*5, 0.);
+    
+    slimp::ArrayWriter writer(
+        slimp::ArrayWriter::view(buffer.data(), {3, 2, 5}), 1, 1, 2);
+    
+    writer(std::vector<double>{42, 43, 1, 2});
+    writer(std::vector<double>{44, 45, 3, 4});
+    
+    auto const array = xt::adapt(buffer, std::vector<std::size_t>{3, 2, 5});
+    BOOST_TEST((
+        xt::view(array, xt::all(), 0) == xt::zeros<double>({3, 5})));
+    BOOST_TEST((
+        xt::view(array, xt::all(), 1)
+        == xt::xarray<double>{{0, 0, 0, 0, 0}, {1, 3, 0, 0, 0}, {2, 4, 0, 0, 0}}));
+}
@@ -0,0 +1,70 @@
+#define BOOST_TEST_MODULE SummaryWriter
+#include <boost/test/unit_test.hpp>
+
+#include <cmath>
+#include <limits>
+#include <random>
+#include <string>
+#include <vector>
+
+#include "slimp/SummaryWriter.h"
+
+BOOST_AUTO_TEST_CASE(Names)
+{
+    slimp::SummaryWriter writer({0.5});
+    writer(std::vector<std::string>{"foo", "bar"});
+    BOOST_TEST((writer.names() == std::vector<std::string>{"foo", "bar"}));
+}
+
+BOOST_AUTO_TEST_CASE(Moments)
+{
+    slimp::SummaryWriter writer({0.5}, 1);
+    
+    writer(std::vector<double>{42, 1, 10});
+    writer(std::vector<double>{43, 2, 20});
+    writer(std::vector<double>{44, 3, 30});
+    BOOST_TEST(writer.count() == 3);
+    
+    auto const mean = writer.mean();
+    BOOST_TEST(mean.size() == 2);
+    BOOST_TEST(mean(0) == 2., boost::test_tools::tolerance(1e-12));
+    BOOST_TEST(mean(1) == 20., boost::test_tools::tolerance(1e-12));
+    
+    auto const sd = writer.sd();
+    BOOST_TEST(sd(0) == std::sqrt(2./3.), boost::test_tools::tolerance(1e-12));
+    BOOST_TEST(sd(1) == std::sqrt(200./3.), boost::test_tools::tolerance(1e-12));
+    
+    // Exact quantiles with less than five draws
+    auto const quantiles = writer.quantiles();
+    BOOST_TEST(quantiles(0, 0) == 2.);
+    BOOST_TEST(quantiles(1, 0) == 20.);
+}
+
+BOOST_AUTO_TEST_CASE(Quantiles)
+{
+    std::mt19937 generator(42);
+    std::normal_distribution<double> distribution(3, 2);
+    
+    slimp::SummaryWriter writer({0.05, 0.5, 0.95});
+    for(int i=0; i!=10000; ++i)
+    {
+        writer(std::vector<double>{distribution(generator)});
+    }
+    
+    auto const quantiles = writer.quantiles();
+    BOOST_TEST(quantiles(0, 0) == 3-1.645*2, boost::test_tools::tolerance(0.05));
+    BOOST_TEST(quantiles(0, 1) == 3., boost::test_tools::tolerance(0.05));
+    BOOST_TEST(quantiles(0, 2) == 3+1.645*2, boost::test_tools::tolerance(0.05));
+}
+
+BOOST_AUTO_TEST_CASE(NaN)
+{
+    slimp::SummaryWriter writer({0.5});
+    for(int i=0; i!=10; ++i)
+    {
+        writer(std::vector<double>{
+            i==3 ? std::numeric_limits<double>::quiet_NaN() : i});
+    }
+    BOOST_TEST(std::isnan(writer.mean()(0)));
+    BOOST_TEST(std::isnan(writer.quantiles()(0, 0)));
+}
@@ -92,3 +92,58 @@ BOOST_AUTO_TEST_CASE(DoubleArray)
         == std::vector<double>{1., 4., 2., 5., 3., 6.}));
 }
 
+
+BOOST_AUTO_TEST_CASE(ColumnMajorBuffer)
+{
+    std::vector<double> const buffer{1., 4., 2., 5., 3., 6.};
+    slimp::VarContext context;
+    context.set("double_key", buffer.data(), {2, 3}, {1, 2});
+    
+    std::vector<std::string> names;
+    context.names_r(names);
+    BOOST_TEST(names == std::vector<std::string>{"double_key"});
+    
+    BOOST_TEST(context.contains_r("double_key"));
+    BOOST_TEST(!context.contains_i("double_key"));
+    
+    BOOST_TEST((context.dims_r("double_key") == std::vector<size_t>{2, 3}));
+    BOOST_TEST(context.is_column_major("double_key"));
+    
+    BOOST_TEST((
+        context.vals_r("double_key")
+        == std::vector<double>{1., 4., 2., 5., 3., 6.}));
+}
+
+BOOST_AUTO_TEST_CASE(RowMajorBuffer)
+{
+    std::vector<int16_t> const buffer{1, 2, 3, 4, 5, 6};
+    slimp::VarContext context;
+    context.set("int_key", buffer.data(), {2, 3}, {3, 1});
+    
+    BOOST_TEST(context.contains_i("int_key"));
+    BOOST_TEST(context.contains_r("int_key"));
+    
+    BOOST_TEST((context.dims_i("int_key") == std::vector<size_t>{2, 3}));
+    BOOST_TEST(!context.is_column_major("int_key"));
+    
+    BOOST_TEST((
+        context.vals_i("int_key") == std::vector<int>{1, 4, 2, 5, 3, 6}));
+    BOOST_TEST((
+        context.vals_r("int_key")
+        == std::vector<double>{1., 4., 2., 5., 3., 6.}));
+}
+
+BOOST_AUTO_TEST_CASE(Replace)
+{
+    std::vector<double> const buffer{1., 2.};
+    slimp::VarContext context;
+    context.set("key", buffer.data(), {2}, {1});
+    context.set("key", xt::xarray<double>{3., 4., 5.});
+    
+    BOOST_TEST((context.dims_r("key") == std::vector<size_t>{3}));
+    BOOST_TEST((context.vals_r("key") == std::vector<double>{3., 4., 5.}));
+    
+    std::vector<std::string> names;
+    context.names_r(names);
+    BOOST_TEST(names == std::vector<std::string>{"key"});
+}
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import textwrap
+import unittest
+
+import numpy
+
+import slimp
+import slimp.compile
+
+@unittest.skipUnless("CMDSTAN" in os.environ, "CMDSTAN is not set")
+class TestCompile(unittest.TestCase):
+    def test_build_model(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # NOTE: the file name is not a valid identifier
+            stan_file = os.path.join(directory, "my-model.stan")
+            with open(stan_file, "w") as fd:
+                fd.write(textwrap.dedent("""\
+                    data { int N; vector[N] y; }
+                    parameters { real mu; }
+                    model { y ~ normal(mu, 1); }
+                """))
+            cache_dir = os.path.join(directory, "cache")
+            
+            module = slimp.compile.build_model(stan_file, cache_dir=cache_dir)
+            modified = os.stat(module.__file__).st_mtime_ns
+            
+            data = module.sample(
+                {"N": 3, "y": numpy.array([1., 2., 3.])},
+                slimp.action_parameters.Sample(
+                    seed=42, num_chains=1, num_warmup=100, num_samples=100))
+            self.assertIn("mu", data["columns"])
+            self.assertEqual(data["array"].shape[2], 100)
+            
+            # Cache hit: the module is neither re-built nor re-loaded
+            self.assertIs(
+                slimp.compile.build_model(stan_file, cache_dir=cache_dir),
+                module)
+            self.assertEqual(os.stat(module.__file__).st_mtime_ns, modified)
+            
+            # Cache miss: a modified model is built to a new module
+            with open(stan_file, "a") as fd:
+                fd.write("generated quantities { real mu2 = mu^2; }\n")
+            other = slimp.compile.build_model(stan_file, cache_dir=cache_dir)
+            self.assertNotEqual(other.__file__, module.__file__)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import re
+import subprocess
+import sys
+import unittest
+
+class TestImport(unittest.TestCase):
+    def _import_time(self, statement):
+        """ Run a statement in a new interpreter, and return the cumulative
+            import time of each module, in microseconds, as reported by
+            -X importtime
+        """
+        
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            capture_output=True, text=True, check=True)
+        
+        times = {}
+        for line in process.stderr.splitlines():
+            match = re.match(
+                r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*(.+)", line)
+            if match:
+                times[match.group(2).strip()] = int(match.group(1))
+        return times
+    
+    def test_import(self):
+        times = self._import_time("import slimp")
+        
+        self.assertIn("slimp", times)
+        for module in [
+                "slimp._slimp", "arviz", "matplotlib", "seaborn", "scipy",
+                "xarray", "pandas", "formulaic"]:
+            self.assertNotIn(module, times)
+    
+    def test_model_import(self):
+        times = self._import_time("import slimp; slimp.Model")
+        
+        self.assertIn("slimp._slimp", times)
+        for module in [
+                "slimp._multilevel", "slimp._multivariate",
+                "slimp._univariate", "arviz", "matplotlib", "seaborn"]:
+            self.assertNotIn(module, times)
+    
+    def test_family_import(self):
+        times = self._import_time(
+            "import pandas, slimp; "
+            "slimp.Model("
+                "'y ~ 1', pandas.DataFrame({'y': [1., 2., 4.]}),"
+                "num_warmup=10, num_samples=10).sample()")
+        
+        self.assertIn("slimp._univariate", times)
+        for module in ["slimp._multilevel", "slimp._multivariate"]:
+            self.assertNotIn(module, times)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -54,6 +54,22 @@ class TestModel(unittest.TestCase):
         self.assertTrue(
             all((low < self.log_likelihood) & (self.log_likelihood < high)))
     
+    def _test_loo_waic(self, model):
+        """Test that LOO and WAIC do not depend on the blocks of observations"""
+        
+        loo, pointwise = slimp.stats.loo(model, block_size=7)
+        self.assertEqual(list(loo.index), ["elpd_loo", "p_loo", "looic"])
+        self.assertEqual(len(pointwise), len(model.data))
+        self.assertTrue(all(pointwise["pareto_k"] < 0.7))
+        
+        expected, _ = slimp.stats.loo(model, block_size=len(model.data))
+        numpy.testing.assert_allclose(loo, expected)
+        
+        waic, _ = slimp.stats.waic(model)
+        numpy.testing.assert_allclose(
+            waic.loc["elpd_waic", "Estimate"], loo.loc["elpd_loo", "Estimate"],
+            rtol=0.05)
+    
     def _test_prior_predict(self, model, alpha):
         low, high = numpy.array([
             slimp.stats.hdi(row, alpha)
@@ -92,8 +92,21 @@ class TestMultiLevel(TestModel):
         self._test_sampler_parameters(model, 42, 4, 1000)
         self._test_hmc_diagnostics(model)
         self._test_draws(model, 0.5)
+        self._test_loo_waic(model)
         self._test_posterior_epred(model, 0.5)
         self._test_posterior_predict(model, 0.5)
+    
+    def test_segment_sampler(self):
+        for non_centered in [False, True]:
+            with self.subTest(non_centered=non_centered):
+                model = slimp.Model(
+                    self.formula, self.data, seed=42, num_chains=4,
+                    sort_groups=True, non_centered=non_centered)
+                model.sample()
+                
+                self._test_hmc_diagnostics(model)
+                self._test_draws(model, 0.5)
+                self._test_posterior_epred(model, 0.5)
 
 if __name__ == "__main__":
     unittest.main()
@@ -97,11 +97,41 @@ class TestMultivariate(TestModel):
         self._test_sampler_parameters(model, 42, 4, 1000)
         self._test_hmc_diagnostics(model)
         self._test_draws(model, 0.5)
+        self._test_loo_waic(model)
         self._test_posterior_epred(model, 0.5)
         self._test_posterior_predict(model, 0.5)
         # NOTE: slimp estimation of R² is better than that of baseline for the
         # second variate, event at very large intervals (0.4). Skip this.
         # self._test_r_squared(model, 0.5)
+    
+    def test_sufficient_statistics(self):
+        model = slimp.Model(
+            self.formula, self.data, seed=42, num_chains=4,
+            sufficient_statistics=True)
+        model.sample()
+        
+        self._test_hmc_diagnostics(model)
+        self._test_draws(model, 0.5)
+        
+        # Same posterior as with the likelihood on all observations
+        reference = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        reference.sample()
+        difference = (model.draws.mean() - reference.draws.mean()).abs()
+        self.assertTrue(all(difference <= 0.2*reference.draws.std()))
+    
+    def test_target_ess(self):
+        # NOTE: the Cholesky factor of the correlation has constant entries,
+        # whose diagnostics are undefined
+        model = slimp.Model(
+            self.formula, self.data, seed=42, num_chains=4, num_samples=100)
+        num_samples = model.sample(target_ess=200, max_samples=2000)
+        
+        self.assertEqual(num_samples % 100, 0)
+        self.assertLess(num_samples, 2000)
+        self.assertEqual(len(model.draws), 4*num_samples)
+        ess = model.summary(rank_normalized=True)["ESS_bulk"].dropna()
+        self.assertTrue((ess >= 200).all())
+        self._test_draws(model, 0.5)
 
 if __name__ == "__main__":
     unittest.main()
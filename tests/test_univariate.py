@@ -82,11 +82,357 @@ class TestUnivariate(TestModel):
         self._test_sampler_parameters(model, 42, 4, 1000)
         self._test_hmc_diagnostics(model)
         self._test_draws(model, 0.5)
+        self._test_loo_waic(model)
         self._test_log_likelihood(model, 0.5)
         self._test_prior_predict(model, 0.5)
         self._test_posterior_epred(model, 0.5)
         self._test_posterior_predict(model, 0.5)
         self._test_r_squared(model, 0.5)
+    
+    def test_warm_start(self):
+        previous = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        previous.sample()
+        
+        model = slimp.Model(
+            self.formula, self.data, seed=43, num_chains=4, num_warmup=0)
+        model.sample(warm_start=previous)
+        
+        self.assertEqual(model.draws.shape, previous.draws.shape)
+        numpy.testing.assert_allclose(
+            model._samples.inv_metric, previous._samples.inv_metric)
+        self._test_hmc_diagnostics(model)
+        self._test_draws(model, 0.5)
+    
+    def test_batch_sample(self):
+        outcomes = numpy.array([
+            self.data["weight"], 2*self.data["weight"],
+            self.data["weight"]+10])
+        draws = slimp.batch_sample(
+            self.formula, self.data, outcomes, seed=42, num_chains=4)
+        
+        self.assertEqual(draws.shape[0], len(outcomes))
+        self.assertEqual(draws.shape[2], 4)
+        self.assertEqual(draws.shape[3], 1000)
+        
+        for task, scale, offset in [(0, 1, 0), (1, 2, 0), (2, 1, 10)]:
+            task_draws = draws.sel(task=task)
+            for name, value in self.parameters.items():
+                value = scale*value + (offset if name == "Intercept" else 0)
+                low, high = slimp.stats.hdi(
+                    task_draws.sel(parameter=name).values.ravel(), 0.5)
+                self.assertTrue(low < value < high)
+    
+    def test_linear_predict_posterior(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        stan = model._generate_quantities("predict_posterior")
+        fast = model._predict_posterior()
+        
+        self.assertEqual(list(stan.columns), list(fast.columns))
+        numpy.testing.assert_allclose(
+            stan.filter(like="mu"), fast.filter(like="mu"))
+        numpy.testing.assert_allclose(
+            stan.filter(like="y").mean(), fast.filter(like="y").mean(),
+            rtol=0.02)
+        numpy.testing.assert_allclose(
+            stan.filter(like="y").std(), fast.filter(like="y").std(),
+            rtol=0.05)
+    
+    def test_predict_iter(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        out = numpy.empty((2, len(model.draws), 1, len(self.data)))
+        chunks = list(model.predict_iter(self.data, chunk_size=6, out=out))
+        self.assertEqual(len(chunks), 4)
+        
+        mu = pandas.concat([x[0] for x in chunks], axis="columns")
+        y = pandas.concat([x[1] for x in chunks], axis="columns")
+        expected_mu, _ = model.predict(self.data)
+        self.assertEqual(list(mu.columns), list(expected_mu.columns))
+        self.assertEqual(list(y.columns), [f"y.{1+x}" for x in range(len(self.data))])
+        numpy.testing.assert_allclose(mu, expected_mu)
+        numpy.testing.assert_allclose(out[0, :, 0], mu)
+        numpy.testing.assert_allclose(out[1, :, 0], y)
+    
+    def test_predict_summary(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        mu, y = model.predict(self.data, summary=True)
+        self.assertEqual(list(mu.index), [f"mu.{1+x}" for x in range(20)])
+        self.assertEqual(list(y.index), [f"y.{1+x}" for x in range(20)])
+        self.assertEqual(
+            list(mu.columns), ["Mean", "StdDev", "5%", "50%", "95%"])
+        
+        expected_mu, expected_y = model.predict(self.data)
+        numpy.testing.assert_allclose(mu["Mean"], expected_mu.mean())
+        numpy.testing.assert_allclose(mu["StdDev"], expected_mu.std(ddof=0))
+        numpy.testing.assert_allclose(
+            mu["50%"], expected_mu.median(), rtol=0.01)
+        numpy.testing.assert_allclose(
+            y["Mean"], expected_y.mean(), rtol=0.02)
+        
+        epred = model.posterior_epred_summary()
+        numpy.testing.assert_allclose(
+            epred["Mean"], model.posterior_epred.mean())
+    
+    def test_summary(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        data = model._samples.samples
+        summary = slimp.summary(data, (5, 50, 95))
+        numpy.testing.assert_allclose(
+            summary["Mean"], numpy.mean(data, axis=(1,2)))
+        numpy.testing.assert_allclose(
+            summary["StdDev"], numpy.std(data, axis=(1,2)))
+        numpy.testing.assert_allclose(
+            summary[["5%", "50%", "95%"]].T,
+            numpy.quantile(data, [0.05, 0.5, 0.95], axis=(1,2)))
+        numpy.testing.assert_allclose(
+            summary["N_Eff"], slimp.get_effective_sample_size(data))
+        numpy.testing.assert_allclose(
+            summary["R_hat"], slimp.get_split_potential_scale_reduction(data))
+    
+    def test_rank_normalized_summary(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        summary = model.summary(rank_normalized=True)
+        self.assertEqual(
+            list(summary.columns),
+            [
+                "Mean", "MCSE", "StdDev", "5%", "50%", "95%",
+                "ESS_bulk", "ESS_tail", "R_hat"])
+        self.assertTrue(numpy.nanmax(summary["R_hat"]) < 1.01)
+        self.assertTrue(numpy.all(summary["ESS_bulk"] > 100))
+        self.assertTrue(numpy.all(summary["ESS_tail"] > 100))
+        
+        # Strided and contiguous draws yield the same diagnostics
+        draws = model._samples.samples.values
+        numpy.testing.assert_allclose(
+            slimp.get_rank_normalized_diagnostics(draws[::2]),
+            slimp.get_rank_normalized_diagnostics(
+                numpy.ascontiguousarray(draws[::2])))
+    
+    def test_parallel_sampler(self):
+        model = slimp.Model(
+            self.formula, self.data, seed=42, num_chains=4, threads_per_chain=2)
+        model.sample()
+        
+        self._test_hmc_diagnostics(model)
+        self._test_draws(model, 0.5)
+    
+    def test_sufficient_statistics(self):
+        model = slimp.Model(
+            self.formula, self.data, seed=42, num_chains=4,
+            sufficient_statistics=True)
+        model.sample()
+        
+        self._test_hmc_diagnostics(model)
+        self._test_draws(model, 0.5)
+        
+        # Same posterior as with the likelihood on all observations
+        reference = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        reference.sample()
+        difference = (model.draws.mean() - reference.draws.mean()).abs()
+        self.assertTrue(all(difference <= 0.2*reference.draws.std()))
+    
+    def test_metric(self):
+        for metric in ["dense_e", "unit_e"]:
+            with self.subTest(metric=metric):
+                model = slimp.Model(
+                    self.formula, self.data, seed=42, num_chains=4,
+                    metric=metric)
+                model.sample()
+                
+                self.assertEqual(model.sampler_parameters.metric, metric)
+                self._test_draws(model, 0.5)
+                
+                size = len(model._samples.parameters_columns)
+                self.assertEqual(
+                    model._samples.inv_metric.shape,
+                    (4, size, size) if metric == "dense_e" else (4, size))
+                if metric == "unit_e":
+                    numpy.testing.assert_equal(model._samples.inv_metric, 1)
+                else:
+                    self.assertFalse(
+                        numpy.isnan(model._samples.inv_metric).any())
+    
+    def test_optimize(self):
+        model = slimp.Model(self.formula, self.data, seed=42)
+        model.optimize()
+        
+        self.assertEqual(len(model.draws), 1)
+        for name in ["Intercept", "group[T.Trt]"]:
+            self.assertAlmostEqual(
+                model.draws[name].iloc[0], self.parameters[name], 1)
+    
+    def test_approximations(self):
+        for method in ["laplace", "pathfinder"]:
+            with self.subTest(method=method):
+                model = slimp.Model(self.formula, self.data, seed=42)
+                getattr(model, method)(draws=1000)
+                
+                self.assertEqual(len(model.draws), 1000)
+                self._test_draws(model, 0.9)
+                self._test_posterior_epred(model, 0.9)
+                self._test_r_squared(model, 0.9)
+    
+    def test_target_ess(self):
+        model = slimp.Model(
+            self.formula, self.data, seed=42, num_chains=4, num_samples=100)
+        num_samples = model.sample(target_ess=400, max_samples=1000)
+        
+        self.assertEqual(num_samples % 100, 0)
+        self.assertTrue(100 < num_samples < 1000)
+        self.assertEqual(len(model.draws), 4*num_samples)
+        self.assertTrue(
+            (model.summary(rank_normalized=True)["ESS_bulk"] >= 400).all())
+        self._test_hmc_diagnostics(model)
+        self._test_draws(model, 0.5)
+    
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            reference = slimp.Model(
+                self.formula, self.data, seed=42, num_chains=4,
+                num_samples=300)
+            reference.sample(checkpoint=directory, checkpoint_every=100)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                [f"block-{i:06d}.npz" for i in range(3)])
+            
+            # Interrupted run: resume after the second block
+            os.remove(os.path.join(directory, "block-000002.npz"))
+            model = slimp.Model(
+                self.formula, self.data, seed=42, num_chains=4,
+                num_samples=300)
+            model.sample(checkpoint=directory, checkpoint_every=100)
+            
+            self.assertEqual(len(os.listdir(directory)), 3)
+            numpy.testing.assert_allclose(model.draws, reference.draws)
+            self._test_draws(model, 0.5)
+            
+            # Blocks of another run are not resumed
+            model = slimp.Model(
+                self.formula, self.data, seed=43, num_chains=4,
+                num_samples=300)
+            with self.assertRaises(ValueError):
+                model.sample(checkpoint=directory, checkpoint_every=100)
+            model = slimp.Model(
+                "weight ~ 1", self.data, seed=42, num_chains=4,
+                num_samples=300)
+            with self.assertRaises(ValueError):
+                model.sample(checkpoint=directory, checkpoint_every=100)
+            model = slimp.Model(
+                self.formula, self.data.iloc[:-1], seed=42, num_chains=4,
+                num_samples=300)
+            with self.assertRaises(ValueError):
+                model.sample(checkpoint=directory, checkpoint_every=100)
+            model = slimp.Model(
+                self.formula, self.data, seed=42, num_chains=4,
+                num_samples=400)
+            with self.assertRaises(ValueError):
+                model.sample(checkpoint=directory, checkpoint_every=100)
+        
+        # The metric is checked before sampling
+        with tempfile.TemporaryDirectory() as directory:
+            model = slimp.Model(
+                self.formula, self.data, seed=42, num_chains=4,
+                metric="dense_e")
+            with self.assertRaises(ValueError):
+                model.sample(checkpoint=directory)
+            self.assertEqual(os.listdir(directory), [])
+    
+    def test_storage(self):
+        reference = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        reference.sample()
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "samples.npy")
+            model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+            model.sample(storage=path)
+            
+            stored = numpy.load(path, mmap_mode="r")
+            numpy.testing.assert_equal(stored, model._samples.samples.values)
+            numpy.testing.assert_allclose(model.draws, reference.draws)
+            self._test_draws(model, 0.5)
+            self._test_posterior_epred(model, 0.5)
+            
+            with self.assertRaises(ValueError):
+                model.sample(storage=path, target_ess=400)
+            
+            del model, stored
+    
+    def test_save_load(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        model.posterior_epred
+        
+        with tempfile.TemporaryDirectory() as directory:
+            model.save(directory, dtype=numpy.float32)
+            for mmap in [True, False]:
+                with self.subTest(mmap=mmap):
+                    loaded = slimp.Model.load(directory, mmap=mmap)
+                    
+                    self.assertEqual(loaded.formula, model.formula)
+                    pandas.testing.assert_frame_equal(loaded.data, model.data)
+                    pandas.testing.assert_frame_equal(
+                        pandas.DataFrame(loaded.predictors),
+                        pandas.DataFrame(model.predictors))
+                    self.assertIsNotNone(
+                        loaded._model_data.new_predictors_spec())
+                    numpy.testing.assert_allclose(
+                        loaded.draws, model.draws, rtol=1e-6)
+                    numpy.testing.assert_allclose(
+                        loaded.posterior_epred, model.posterior_epred,
+                        rtol=1e-6)
+                    
+                    self._test_draws(loaded, 0.5)
+                    self._test_r_squared(loaded, 0.5)
+                    mu, y = loaded.predict(self.data)
+                    self.assertEqual(mu.shape, model.posterior_epred.shape)
+                    
+                    del loaded
+    
+    def test_predict_categorical_levels(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        # NOTE: the batch only has one level of the categorical predictor
+        batch = self.data.iloc[-3:]
+        predictors = model._model_data.new_predictors(batch)
+        self.assertEqual(
+            list(predictors.columns), list(model.predictors.columns))
+        
+        mu, _ = model.predict(batch)
+        expected_mu, _ = model.predict(self.data)
+        numpy.testing.assert_allclose(mu, expected_mu.iloc[:, -3:])
+    
+    def test_freeze(self):
+        model = slimp.Model(self.formula, self.data, seed=42, num_chains=4)
+        model.sample()
+        
+        predictor = model.freeze()
+        self.assertEqual(predictor.num_draws, len(model.draws))
+        mu, y = predictor.predict(self.data, seed=42)
+        self.assertEqual(mu.shape, (len(model.draws), 1, len(self.data)))
+        self.assertEqual(y.shape, mu.shape)
+        
+        expected_mu, expected_y = model.predict(self.data)
+        numpy.testing.assert_allclose(mu[:, 0], expected_mu)
+        numpy.testing.assert_allclose(
+            y[:, 0].mean(axis=0), expected_y.mean(), rtol=0.05)
+        
+        predictor = model.freeze(draws=100, dtype=numpy.float32)
+        predictors = predictor.predictors(self.data.iloc[:1])
+        mu = predictor.epred(predictors[0])
+        self.assertEqual(mu.shape, (100, 1, 1))
+        self.assertEqual(mu.dtype, numpy.float32)
+        numpy.testing.assert_allclose(
+            mu.mean(), expected_mu.iloc[:, 0].mean(), rtol=0.01)
 
 if __name__ == "__main__":
     unittest.main()